@@ -0,0 +1,126 @@
+"""
+This file contains a DistanceOracle object which answers maze distance
+queries for a walls grid from cached breadth first searches.
+
+Example:
+oracle = getDistanceOracle(gameState.getWalls())
+oracle.getDistance( (1,1), (10,10) )
+
+Oracles are shared through a global dictionary keyed by the walls grid, so
+search problems, heuristics and feature extractors working on the same
+layout all reuse the same distances.  The distances from a source cell are
+computed the first time they are needed and stored in a dense array indexed
+by cell.  At most maxSources of these arrays are kept; the least recently
+used one is dropped first.
+"""
+
+from array import array
+from collections import OrderedDict
+from game import getSuccessorTable
+
+UNREACHABLE = -1
+DEFAULT_MAX_SOURCES = 4096
+
+ORACLE_CACHE = {}
+_lastOracle = None
+
+
+def getDistanceOracle(walls):
+    """
+    Returns the DistanceOracle shared by every caller using this walls grid.
+    """
+    global _lastOracle
+    # Heuristics call this once per node, so skip hashing the grid when the
+    # same walls object is asked for twice in a row
+    if _lastOracle is not None and _lastOracle.walls is walls:
+        return _lastOracle
+    if walls not in ORACLE_CACHE:
+        ORACLE_CACHE[walls] = DistanceOracle(walls)
+    _lastOracle = ORACLE_CACHE[walls]
+    return _lastOracle
+
+
+class DistanceOracle:
+    """
+    Maze distances between the open cells of a walls grid.
+
+    Cells are numbered x * height + y.  For each source that has been
+    queried, the oracle keeps the distance to every cell (UNREACHABLE for
+    walls and cut-off regions) and the cells in the order the search
+    reached them, which makes nearest-target queries a linear scan.  The
+    searches follow the successor table shared with the search problems
+    (game.getSuccessorTable).
+    """
+
+    def __init__(self, walls, maxSources=DEFAULT_MAX_SOURCES):
+        self.walls = walls
+        self.width = walls.width
+        self.height = walls.height
+        self.maxSources = maxSources
+        self._sources = OrderedDict()
+
+        height = self.height
+        self.neighbors = [()] * (self.width * height)
+        for (x, y), moves in getSuccessorTable(walls).items():
+            self.neighbors[x * height + y] = tuple(nextx * height + nexty for (nextx, nexty), action in moves)
+
+    def cellIndex(self, position):
+        x, y = position
+        return int(x) * self.height + int(y)
+
+    def cellPosition(self, index):
+        return divmod(index, self.height)
+
+    def distancesFrom(self, position):
+        """
+        Returns (distances, order) for a source position: the distance to
+        every cell index, and the reachable cell indices sorted by distance.
+        """
+        source = self.cellIndex(position)
+        table = self._sources.get(source)
+        if table is not None:
+            self._sources.move_to_end(source)
+            return table
+
+        distances = array('i', [UNREACHABLE]) * (self.width * self.height)
+        order = array('i', [source])
+        distances[source] = 0
+        neighbors = self.neighbors
+        head = 0
+        while head < len(order):
+            cell = order[head]
+            head += 1
+            nextDistance = distances[cell] + 1
+            for other in neighbors[cell]:
+                if distances[other] == UNREACHABLE:
+                    distances[other] = nextDistance
+                    order.append(other)
+
+        table = (distances, order)
+        self._sources[source] = table
+        if self.maxSources is not None and len(self._sources) > self.maxSources:
+            self._sources.popitem(last=False)
+        return table
+
+    def getDistance(self, pos1, pos2):
+        """
+        Returns the maze distance between two positions, or None if pos2
+        cannot be reached from pos1.
+        """
+        distance = self.distancesFrom(pos1)[0][self.cellIndex(pos2)]
+        if distance == UNREACHABLE:
+            return None
+        return distance
+
+    def nearest(self, position, grid):
+        """
+        Returns the maze distance from position to the closest cell that is
+        True in grid (e.g. a food grid), or None if none can be reached.
+        """
+        distances, order = self.distancesFrom(position)
+        height = self.height
+        for cell in order:
+            x, y = divmod(cell, height)
+            if grid[x][y]:
+                return distances[cell]
+        return None
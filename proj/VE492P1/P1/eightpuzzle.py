@@ -1,5 +1,8 @@
 import search
 import random
+import collections
+import heapq
+import os
 
 # Module Classes
 
@@ -147,7 +150,23 @@ class EightPuzzleState:
         return True
 
     def __hash__(self):
-        return hash(str(self.cells))
+        return hash(self.pack())
+
+    def pack(self):
+        """
+          Returns the state packed into an integer (see SlidingPuzzle).
+
+        >>> EightPuzzleState([0, 1, 2, 3, 4, 5, 6, 7, 8]).pack() == SlidingPuzzle(3).goal
+        True
+        """
+        state = 0
+        shift = 4
+        for row in self.cells:
+            for tile in row:
+                state |= tile << shift
+                shift += 4
+        row, col = self.blankLocation
+        return state | (row * 3 + col)
 
     def __getAsciiString(self):
         """
@@ -182,7 +201,7 @@ class EightPuzzleSearchProblem(search.SearchProblem):
         self.puzzle = puzzle
 
     def getStartState(self):
-        return puzzle
+        return self.puzzle
 
     def isGoalState(self,state):
         return state.isGoal()
@@ -248,6 +267,348 @@ def createRandomEightPuzzle(moves=100):
         puzzle = puzzle.result(random.sample(puzzle.legalMoves(), 1)[0])
     return puzzle
 
+# Compact puzzles and pattern databases
+#
+# For fast search a puzzle state is packed into a single integer: the tile
+# in cell i (cells numbered row by row) takes the four bits at 4 * (i + 1),
+# and the lowest four bits hold the cell of the blank.  Moving the blank is
+# then a couple of shifts and xors, and states hash and compare as ints.
+# The same packing works for any side up to 4, so the 15-puzzle uses the
+# same code with SlidingPuzzle(4).
+
+PATTERN_DB_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'patterndbs')
+
+# Disjoint tile groups for the additive pattern databases, keyed by side
+PATTERN_PARTITIONS = {
+    3: ((1, 2, 3, 4), (5, 6, 7, 8)),
+    4: ((1, 4, 5, 8, 12), (2, 3, 6, 7, 11), (9, 10, 13, 14, 15)),
+}
+
+def permutationRank(items, size):
+    """
+      Returns the rank of a sequence of distinct integers drawn from
+    range(size) among all sequences of the same length (a Lehmer code).
+    Full permutations of range(size) get ranks 0 .. size! - 1.
+
+    >>> permutationRank([0, 1, 2], 3), permutationRank([2, 1, 0], 3)
+    (0, 5)
+    """
+    rank = 0
+    for i, item in enumerate(items):
+        digit = item
+        for previous in items[:i]:
+            if previous < item:
+                digit -= 1
+        rank = rank * (size - i) + digit
+    return rank
+
+def permutationUnrank(rank, size, length=None):
+    """
+      Inverse of permutationRank.
+
+    >>> permutationUnrank(permutationRank([3, 0, 2], 4), 4, 3)
+    [3, 0, 2]
+    """
+    if length is None:
+        length = size
+    digits = []
+    for i in range(length - 1, -1, -1):
+        rank, digit = divmod(rank, size - i)
+        digits.append(digit)
+    digits.reverse()
+    unused = list(range(size))
+    return [unused.pop(digit) for digit in digits]
+
+class SlidingPuzzle:
+    """
+      The mechanics of a side x side sliding puzzle on packed integer
+    states.  The goal has the blank in the top left corner followed by the
+    tiles in order, as in EightPuzzleState.isGoal.
+    """
+    def __init__(self, side=3):
+        self.side = side
+        self.size = side * side
+        self.goal = self.pack(range(self.size))
+        # For every blank cell: (cell the blank moves to, move, tile shift,
+        # blank shift)
+        self.moves = []
+        for cell in range(self.size):
+            row, col = divmod(cell, side)
+            moves = []
+            for move, newrow, newcol in (('up', row - 1, col), ('down', row + 1, col),
+                                         ('left', row, col - 1), ('right', row, col + 1)):
+                if 0 <= newrow < side and 0 <= newcol < side:
+                    other = newrow * side + newcol
+                    moves.append((other, move, 4 * (other + 1), 4 * (cell + 1)))
+            self.moves.append(tuple(moves))
+
+    def pack(self, numbers):
+        "Packs a sequence of tiles, listed row by row with 0 as the blank"
+        state = 0
+        for cell, tile in enumerate(numbers):
+            state |= tile << (4 * (cell + 1))
+            if tile == 0:
+                state |= cell
+        return state
+
+    def unpack(self, state):
+        "Returns the tiles of a packed state, listed row by row"
+        return [(state >> (4 * (cell + 1))) & 15 for cell in range(self.size)]
+
+    def successors(self, state):
+        "Returns a list of (successor, move) pairs for a packed state"
+        result = []
+        blank = state & 15
+        for other, move, tileShift, blankShift in self.moves[blank]:
+            tile = (state >> tileShift) & 15
+            successor = state ^ (tile << tileShift) ^ (tile << blankShift) ^ blank ^ other
+            result.append((successor, move))
+        return result
+
+    def rank(self, state):
+        "Returns the permutation rank of a packed state, in 0 .. size! - 1"
+        return permutationRank(self.unpack(state), self.size)
+
+    def randomState(self, moves=100):
+        "Applies moves random moves to the goal state"
+        state = self.goal
+        for i in range(moves):
+            state = random.choice(self.successors(state))[0]
+        return state
+
+class PatternDatabase:
+    """
+      A set of disjoint additive pattern databases for a SlidingPuzzle.
+
+    For each group of tiles, the table holds the fewest moves of tiles in
+    the group needed to bring them home from where they and the blank are,
+    over every placement of the other tiles.  Only moves of a group's own
+    tiles are counted, so the values of disjoint groups can be added and
+    the sum is still an admissible heuristic.  Keeping the blank in the
+    pattern also makes it consistent: a move changes the value of the moved
+    tile's group by at most one and leaves the others alone, so A* never
+    needs to reopen a state.
+
+    Tables are indexed by the rank of the cells holding the group's tiles
+    times size plus the blank cell.  They are built once by a breadth first
+    search backwards from the goal and then saved under PATTERN_DB_DIR, so
+    later runs just read them.  For lookups each table is spread out over
+    every sequence of cells (size ** (len(group) + 1) entries), which saves
+    ranking the cells at every node.
+    """
+    def __init__(self, puzzle, partition=None, directory=PATTERN_DB_DIR):
+        if partition is None:
+            partition = PATTERN_PARTITIONS[puzzle.side]
+        self.puzzle = puzzle
+        self.partition = tuple(tuple(group) for group in partition)
+        self.tables = [self.loadTable(group, directory) for group in self.partition]
+        self.lookups = [self.spreadTable(table, len(group)) for group, table in zip(self.partition, self.tables)]
+        # For every tile: (its group, how much the group's lookup index
+        # changes per cell the tile moves), or None if it is in no group
+        self.tileSteps = [None] * puzzle.size
+        for number, group in enumerate(self.partition):
+            for i, tile in enumerate(group):
+                self.tileSteps[tile] = (number, puzzle.size ** (len(group) - 1 - i))
+
+    def loadTable(self, group, directory):
+        size = self.puzzle.size
+        entries = size
+        for i in range(len(group)):
+            entries *= size - i
+        name = 'puzzle%dx%d-%s.pdb' % (self.puzzle.side, self.puzzle.side,
+                                       '-'.join(str(tile) for tile in group))
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                table = bytearray(f.read())
+            if len(table) == entries:
+                return table
+        table = self.buildTable(group, entries // size)
+        if not os.path.exists(directory): os.mkdir(directory)
+        with open(path, 'wb') as f:
+            f.write(table)
+        return table
+
+    def buildTable(self, group, entries):
+        """
+          Breadth first search over placements of the group's tiles and the
+        blank.  Moves of other tiles cost nothing, so they go to the front of
+        the queue (0-1 BFS).  entries is the number of placements of the
+        group's tiles.
+        """
+        puzzle = self.puzzle
+        size = puzzle.size
+        neighbors = [[move[0] for move in moves] for moves in puzzle.moves]
+        unseen = 255
+        # The abstract state is (cells of the group's tiles, blank cell);
+        # its index is rank * size + blank
+        distances = bytearray([unseen]) * (entries * size)
+        start = tuple(group)  # In the goal, tile t sits in cell t
+        distances[permutationRank(start, size) * size] = 0
+        queue = collections.deque([(start, 0, 0)])
+        while queue:
+            cells, blank, distance = queue.popleft()
+            index = permutationRank(cells, size)
+            if distances[index * size + blank] < distance:
+                continue
+            for other in neighbors[blank]:
+                if other in cells:
+                    moved = tuple(blank if cell == other else cell for cell in cells)
+                    nextDistance = distance + 1
+                else:
+                    moved = cells
+                    nextDistance = distance
+                key = permutationRank(moved, size) * size + other
+                if nextDistance < distances[key]:
+                    distances[key] = nextDistance
+                    if nextDistance == distance:
+                        queue.appendleft((moved, other, nextDistance))
+                    else:
+                        queue.append((moved, other, nextDistance))
+        return distances
+
+    def spreadTable(self, table, length):
+        "Reindexes a table by the cells in base size instead of their rank"
+        size = self.puzzle.size
+        lookup = bytearray(size ** (length + 1))
+        for rank in range(len(table) // size):
+            index = 0
+            for cell in permutationUnrank(rank, size, length):
+                index = index * size + cell
+            index *= size
+            lookup[index:index + size] = table[rank * size:(rank + 1) * size]
+        return lookup
+
+    def indices(self, state):
+        """
+          Returns the index of the cells of every group for a packed state.
+        The lookup index adds the blank: index * size + blank.
+        """
+        size = self.puzzle.size
+        cells = [0] * size
+        for cell in range(size):
+            state >>= 4
+            cells[state & 15] = cell
+        result = []
+        for group in self.partition:
+            index = 0
+            for tile in group:
+                index = index * size + cells[tile]
+            result.append(index)
+        return result
+
+    def value(self, state):
+        "Returns the sum of the group values for a packed state"
+        size = self.puzzle.size
+        blank = state & 15
+        total = 0
+        for lookup, index in zip(self.lookups, self.indices(state)):
+            total += lookup[index * size + blank]
+        return total
+
+PATTERN_DB_CACHE = {}
+
+def getPatternDatabase(puzzle, partition=None):
+    "Returns the PatternDatabase shared by every problem on this puzzle size"
+    if partition is not None:
+        partition = tuple(tuple(group) for group in partition)
+    key = (puzzle.side, partition)
+    if key not in PATTERN_DB_CACHE:
+        PATTERN_DB_CACHE[key] = PatternDatabase(puzzle, partition)
+    return PATTERN_DB_CACHE[key]
+
+class PuzzleSearchProblem(search.SearchProblem):
+    """
+      A SearchProblem for sliding puzzles whose states are packed integers
+    (see SlidingPuzzle).  Use it with patternDatabaseHeuristic:
+
+      problem = PuzzleSearchProblem(loadEightPuzzle(2).pack())
+      path = search.aStarSearch(problem, patternDatabaseHeuristic)
+    """
+    def __init__(self, start, side=3, partition=None):
+        self.puzzle = SlidingPuzzle(side)
+        self.start = start
+        self.patternDatabase = getPatternDatabase(self.puzzle, partition)
+        self._expanded = 0
+
+    def getStartState(self):
+        return self.start
+
+    def isGoalState(self, state):
+        return state == self.puzzle.goal
+
+    def getSuccessors(self, state):
+        self._expanded += 1
+        return [(successor, move, 1) for successor, move in self.puzzle.successors(state)]
+
+    def getCostOfActions(self, actions):
+        return len(actions)
+
+def patternDatabaseHeuristic(state, problem):
+    "The additive pattern database heuristic for a PuzzleSearchProblem"
+    return problem.patternDatabase.value(state)
+
+def solvePuzzle(start, side=3, partition=None):
+    """
+      Returns an optimal list of moves solving a packed puzzle state.
+
+    This is A* with the pattern database heuristic, specialised to packed
+    states: a move shifts one tile by one cell, so only the cells index of
+    that tile's group changes, by a fixed step.  Ties on f go to the deeper
+    node.  Use search.aStarSearch on a PuzzleSearchProblem to get the same
+    answer through the generic code.
+
+    >>> solvePuzzle(loadEightPuzzle(0).pack())
+    ['left']
+    """
+    puzzle = SlidingPuzzle(side)
+    database = getPatternDatabase(puzzle, partition)
+    lookups = database.lookups
+    tileSteps = database.tileSteps
+    goal = puzzle.goal
+
+    size = puzzle.size
+    indices = tuple(database.indices(start))
+    heuristic = sum(lookup[index * size + (start & 15)] for lookup, index in zip(lookups, indices))
+    fringe = [(heuristic, 0, start, indices)]
+    parents = {start: None}
+    costs = {start: 0}
+    while fringe:
+        f, depth, state, indices = heapq.heappop(fringe)
+        cost = -depth
+        if costs[state] < cost:
+            continue
+        if state == goal:
+            path = []
+            while parents[state] is not None:
+                state, move = parents[state]
+                path.append(move)
+            path.reverse()
+            return path
+        nextCost = cost + 1
+        blank = state & 15
+        for other, move, tileShift, blankShift in puzzle.moves[blank]:
+            tile = (state >> tileShift) & 15
+            successor = state ^ (tile << tileShift) ^ (tile << blankShift) ^ blank ^ other
+            if successor in costs and costs[successor] <= nextCost:
+                continue
+            step = tileSteps[tile]
+            if step is None:
+                nextIndices = indices
+            else:
+                number, scale = step
+                nextIndices = list(indices)
+                nextIndices[number] += (blank - other) * scale
+                nextIndices = tuple(nextIndices)
+            # The blank moved, so every group's value may change
+            nextHeuristic = 0
+            for lookup, index in zip(lookups, nextIndices):
+                nextHeuristic += lookup[index * size + other]
+            costs[successor] = nextCost
+            parents[successor] = (state, move)
+            heapq.heappush(fringe, (nextCost + nextHeuristic, -nextCost, successor, nextIndices))
+    return None
+
 if __name__ == '__main__':
     puzzle = createRandomEightPuzzle(25)
     print('A random puzzle:')
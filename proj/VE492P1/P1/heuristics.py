@@ -0,0 +1,79 @@
+"""
+This file contains heuristics for the search problems in searchAgents.py
+that have to visit a set of positions (all of the food, or all of the
+corners).
+
+The bound used is the weight of a minimum spanning tree over the positions
+still to be visited, plus the maze distance from Pacman to the closest of
+them.  Any path that visits every position contains a path from Pacman to
+one of them and a spanning tree of the rest, so the bound is admissible;
+moving one step changes it by at most one, so it is also consistent.
+
+Edge weights are maze distances from the DistanceOracle shared by the
+layout (distanceOracle.py).  The spanning tree only depends on the set of
+positions left, so its weight is memoized in problem.heuristicInfo, keyed
+by that set (for food, the FoodSet and hence its bitmask).
+"""
+
+from distanceOracle import getDistanceOracle, UNREACHABLE
+
+
+def spanningTreeWeight(positions, oracle):
+    """
+    Returns the weight of a minimum spanning tree over positions, using
+    maze distances as edge weights (Prim's algorithm).
+    """
+    positions = list(positions)
+    if len(positions) < 2:
+        return 0
+    cells = [oracle.cellIndex(position) for position in positions]
+    best = dict((i, float('inf')) for i in range(1, len(positions)))
+    added = 0
+    total = 0
+    while best:
+        distances = oracle.distancesFrom(positions[added])[0]
+        for i in best:
+            distance = distances[cells[i]]
+            if distance != UNREACHABLE and distance < best[i]:
+                best[i] = distance
+        added = min(best, key=best.get)
+        total += best.pop(added)
+    return total
+
+
+def closestDistance(position, positions, oracle):
+    "Returns the maze distance from position to the closest of positions"
+    distances = oracle.distancesFrom(position)[0]
+    closest = float('inf')
+    for target in positions:
+        distance = distances[oracle.cellIndex(target)]
+        if distance != UNREACHABLE and distance < closest:
+            closest = distance
+    return closest
+
+
+def spanningTreeHeuristic(position, remaining, problem, key):
+    """
+    Returns the spanning tree bound for Pacman at position with the
+    positions in remaining left to visit.  key identifies remaining in the
+    memo table problem.heuristicInfo['spanningTree'].
+    """
+    if not remaining:
+        return 0
+    oracle = getDistanceOracle(problem.walls)
+    memo = problem.heuristicInfo.setdefault('spanningTree', {})
+    if key not in memo:
+        memo[key] = spanningTreeWeight(remaining, oracle)
+    return memo[key] + closestDistance(position, remaining, oracle)
+
+
+def foodSpanningTreeHeuristic(state, problem):
+    "A consistent heuristic for the FoodSearchProblem"
+    position, foodGrid = state
+    return spanningTreeHeuristic(position, foodGrid.asList(), problem, foodGrid)
+
+
+def cornersSpanningTreeHeuristic(state, problem):
+    "A consistent heuristic for the CornersProblem"
+    position, corners = state
+    return spanningTreeHeuristic(position, corners, problem, corners)
@@ -38,6 +38,22 @@ import sys, types, time, random, os
 # YOUR INTERFACE TO THE PACMAN WORLD: A GameState #
 ###################################################
 
+class ExploredCounter:
+    """
+    Stands in for the explored set when only the number of states matters.
+    It counts every state added, including repeats, and holds on to none of
+    them, so its memory use does not grow.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def add(self, state):
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
 class GameState:
     """
     A GameState specifies the full game state, including the food, capsules,
@@ -57,11 +73,32 @@ class GameState:
     # Accessor methods: use these to access state data #
     ####################################################
 
-    # static variable keeps track of which states have had getLegalActions called
-    explored = set()
+    # static variable keeps track of which states have had getLegalActions called.
+    # Tracking costs a hash of every state generated, so it is off unless
+    # turned on with setExploredTracking (the autograder does, to count the
+    # states an agent explores)
+    explored = None
+    def setExploredTracking(mode='set'):
+        """
+        mode is 'set' to keep every state generated (what getAndResetExplored
+        returns), 'count' to keep only an ExploredCounter, or None to stop
+        tracking.
+        """
+        if mode == 'set':
+            GameState.explored = set()
+        elif mode == 'count':
+            GameState.explored = ExploredCounter()
+        elif mode is None:
+            GameState.explored = None
+        else:
+            raise Exception('Unknown explored tracking mode ' + str(mode))
+    setExploredTracking = staticmethod(setExploredTracking)
+
     def getAndResetExplored():
-        tmp = GameState.explored.copy()
-        GameState.explored = set()
+        tmp = GameState.explored
+        if tmp is None:
+            return set()
+        GameState.explored = tmp.__class__()
         return tmp
     getAndResetExplored = staticmethod(getAndResetExplored)
 
@@ -106,8 +143,9 @@ class GameState:
         # Book keeping
         state.data._agentMoved = agentIndex
         state.data.score += state.data.scoreChange
-        GameState.explored.add(self)
-        GameState.explored.add(state)
+        if GameState.explored is not None:
+            GameState.explored.add(self)
+            GameState.explored.add(state)
         return state
 
     def getLegalPacmanActions( self ):
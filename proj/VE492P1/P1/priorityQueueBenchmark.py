@@ -0,0 +1,69 @@
+"""
+This file times util.PriorityQueue.update against the linear scan it
+replaced.
+
+Usage:
+python priorityQueueBenchmark.py [n ...]
+
+For each n, 3n update() calls with random priorities are made over n items,
+then the queue is drained.  The scanning queue takes minutes at n=20000, so
+only 1000 and 5000 are run by default.
+"""
+
+import heapq
+import random
+import sys
+import time
+import util
+
+class ScanningPriorityQueue(util.PriorityQueue):
+    """
+      The PriorityQueue from before update() became a decrease-key: it scans
+    the heap for the item and re-heapifies.
+    """
+    def  __init__(self):
+        self.heap = []
+        self.count = 0
+
+    def push(self, item, priority):
+        entry = (priority, self.count, item)
+        heapq.heappush(self.heap, entry)
+        self.count += 1
+
+    def pop(self):
+        (_, _, item) = heapq.heappop(self.heap)
+        return item
+
+    def isEmpty(self):
+        return len(self.heap) == 0
+
+    def update(self, item, priority):
+        for index, (p, c, i) in enumerate(self.heap):
+            if i == item:
+                if p <= priority:
+                    break
+                del self.heap[index]
+                self.heap.append((priority, c, item))
+                heapq.heapify(self.heap)
+                break
+        else:
+            self.push(item, priority)
+
+def timeQueue(queueClass, updates):
+    "Returns the seconds taken to apply updates to a new queue and drain it"
+    start = time.perf_counter()
+    queue = queueClass()
+    for item, priority in updates:
+        queue.update(item, priority)
+    while not queue.isEmpty():
+        queue.pop()
+    return time.perf_counter() - start
+
+if __name__ == '__main__':
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 5000]
+    random.seed(0)
+    for n in sizes:
+        updates = [(random.randrange(n), random.random()) for i in range(3 * n)]
+        old = timeQueue(ScanningPriorityQueue, updates)
+        new = timeQueue(util.PriorityQueue, updates)
+        print('n=%-8d old %8.3fs   new %8.3fs' % (n, old, new))
@@ -3,7 +3,9 @@ In search.py, you will implement generic search algorithms which are called by
 Pacman agents (in searchAgents.py).
 """
 
+import heapq
 import util
+from array import array
 
 
 class SearchProblem:
@@ -49,6 +51,26 @@ class SearchProblem:
         util.raiseNotDefined()
 
 
+ROOT = -1
+
+
+def reconstructPath(node, parents, actions):
+    """
+    Rebuilds the list of actions leading to a search node.
+
+    Search nodes are indices into two parallel tables: parents[node] is the
+    index of the node it was generated from (ROOT for the start node) and
+    actions[node] is the action taken to reach it.  Walking the parent
+    pointers once at the goal avoids copying a path list for every node.
+    """
+    path = []
+    while parents[node] != ROOT:
+        path.append(actions[node])
+        node = parents[node]
+    path.reverse()
+    return path
+
+
 def tinyMazeSearch(problem):
     """
     Returns a sequence of moves that solves tinyMaze.  For any other maze, the
@@ -77,19 +99,21 @@ def depthFirstSearch(problem):
     "*** YOUR CODE HERE ***"
     problem: SearchProblem
     closed = set()
+    parents, actions = array('l', [ROOT]), [None]
     fringe = util.Stack()
-    fringe.push((problem.getStartState(), []))
+    fringe.push((problem.getStartState(), 0))
     while True:
         if fringe.isEmpty():
             return None
-        (state, path) = fringe.pop()
+        (state, node) = fringe.pop()
         if problem.isGoalState(state):
-            return path
+            return reconstructPath(node, parents, actions)
         if state not in closed:
             closed.add(state)
-            for successor in problem.getSuccessors(state):
-                new_path = path + [successor[1]]
-                fringe.push((successor[0], new_path))
+            for successor, action, _ in problem.getSuccessors(state):
+                parents.append(node)
+                actions.append(action)
+                fringe.push((successor, len(actions) - 1))
 
 
 def breadthFirstSearch(problem):
@@ -97,20 +121,22 @@ def breadthFirstSearch(problem):
     "*** YOUR CODE HERE ***"
     problem: SearchProblem
     closed = set()
+    parents, actions = array('l', [ROOT]), [None]
     fringe = util.Queue()
-    fringe.push((problem.getStartState(), []))
+    fringe.push((problem.getStartState(), 0))
     while True:
         if fringe.isEmpty():
             return None
-        (state, path) = fringe.pop()
+        (state, node) = fringe.pop()
         if problem.isGoalState(state):
-            return path
+            return reconstructPath(node, parents, actions)
         if state not in closed:
             closed.add(state)
-            for successor in problem.getSuccessors(state):
-                if successor[0] not in closed:
-                    new_path = path + [successor[1]]
-                    fringe.push((successor[0], new_path))
+            for successor, action, _ in problem.getSuccessors(state):
+                if successor not in closed:
+                    parents.append(node)
+                    actions.append(action)
+                    fringe.push((successor, len(actions) - 1))
 
 
 def uniformCostSearch(problem):
@@ -118,20 +144,27 @@ def uniformCostSearch(problem):
     "*** YOUR CODE HERE ***"
     problem: SearchProblem
     closed = set()
+    parents, actions = array('l', [ROOT]), [None]
+    start = problem.getStartState()
+    frontier = {start: (0, 0)}  # Best queued (node, cost) for each state on the fringe
     fringe = util.PriorityQueue()
-    fringe.push((problem.getStartState(), [], 0), 0)
+    fringe.push(start, 0)
     while True:
         if fringe.isEmpty():
             return None
-        (state, path, cost) = fringe.pop()
+        state = fringe.pop()
+        (node, cost) = frontier.pop(state)
         if problem.isGoalState(state):
-            return path
-        if state not in closed:
-            closed.add(state)
-            for successor in problem.getSuccessors(state):
-                new_path = path + [successor[1]]
-                new_cost = cost + successor[2]
-                fringe.update((successor[0], new_path, new_cost), new_cost)
+            return reconstructPath(node, parents, actions)
+        closed.add(state)
+        for successor, action, take_cost in problem.getSuccessors(state):
+            new_cost = cost + take_cost
+            if successor in closed or (successor in frontier and frontier[successor][1] <= new_cost):
+                continue
+            parents.append(node)
+            actions.append(action)
+            frontier[successor] = (len(actions) - 1, new_cost)
+            fringe.update(successor, new_cost)
 
 
 def nullHeuristic(state, problem=None):
@@ -147,20 +180,478 @@ def aStarSearch(problem, heuristic=nullHeuristic):
     "*** YOUR CODE HERE ***"
     problem: SearchProblem
     closed = set()
+    parents, actions = array('l', [ROOT]), [None]
+    start = problem.getStartState()
+    frontier = {start: (0, 0)}  # Best queued (node, cost) for each state on the fringe
     fringe = util.PriorityQueue()
-    fringe.push((problem.getStartState(), [], 0), 0)
+    fringe.push(start, 0)
     while True:
         if fringe.isEmpty():
             return None
-        (state, path, cost) = fringe.pop()
+        state = fringe.pop()
+        (node, cost) = frontier.pop(state)
         if problem.isGoalState(state):
+            return reconstructPath(node, parents, actions)
+        closed.add(state)
+        for successor, action, take_cost in problem.getSuccessors(state):
+            new_cost = cost + take_cost
+            if successor in closed or (successor in frontier and frontier[successor][1] <= new_cost):
+                continue
+            parents.append(node)
+            actions.append(action)
+            frontier[successor] = (len(actions) - 1, new_cost)
+            fringe.update(successor, new_cost + heuristic(successor, problem))
+
+
+class ReverseProblem:
+    """
+    Wraps a single-goal search problem so that heuristics written for it
+    estimate the cost back to its start state instead of to its goal.
+    """
+
+    def __init__(self, problem):
+        self.problem = problem
+        self.goal = problem.getStartState()
+
+    def __getattr__(self, name):
+        return getattr(self.problem, name)
+
+
+def joinPaths(meet, forward, backward):
+    """
+    Joins the two halves of a bidirectional search at the state meet.
+
+    forward maps each state reached from the start to (parent, action) and
+    backward maps each state reached from the goal to (child, action); the
+    start and goal map to None.
+    """
+    path = []
+    state = meet
+    while forward[state] is not None:
+        state, action = forward[state]
+        path.append(action)
+    path.reverse()
+    state = meet
+    while backward[state] is not None:
+        state, action = backward[state]
+        path.append(action)
+    return path
+
+
+def bidirectionalBreadthFirstSearch(problem):
+    """
+    Search breadth first from the start and, through problem.getPredecessors,
+    backwards from problem.goal at the same time.  A whole layer of the
+    smaller frontier is expanded at a time, and the search stops at the end
+    of the first layer in which the two trees meet.
+    """
+    problem: SearchProblem
+    start, goal = problem.getStartState(), problem.goal
+    if problem.isGoalState(start):
+        return []
+    trees = ({start: None}, {goal: None})
+    depths = ({start: 0}, {goal: 0})
+    layers = ([start], [goal])
+    expand = (problem.getSuccessors, problem.getPredecessors)
+    while layers[0] and layers[1]:
+        side = 0 if len(layers[0]) <= len(layers[1]) else 1
+        tree, depth, otherDepth = trees[side], depths[side], depths[1 - side]
+        nextLayer, best, meet = [], float('inf'), None
+        for state in layers[side]:
+            for nextState, action, _ in expand[side](state):
+                if nextState in tree:
+                    continue
+                tree[nextState] = (state, action)
+                depth[nextState] = depth[state] + 1
+                nextLayer.append(nextState)
+                if nextState in otherDepth and depth[nextState] + otherDepth[nextState] < best:
+                    best, meet = depth[nextState] + otherDepth[nextState], nextState
+        if meet is not None:
+            problem.isGoalState(goal)  # Lets the problem draw the expanded cells
+            return joinPaths(meet, trees[0], trees[1])
+        layers = (nextLayer, layers[1]) if side == 0 else (layers[0], nextLayer)
+    return None
+
+
+def bidirectionalAStarSearch(problem, heuristic=nullHeuristic):
+    """
+    Run A* forward from the start and, through problem.getPredecessors,
+    backwards from problem.goal, always expanding the side with the smaller
+    fringe.  The backward search evaluates heuristic against a ReverseProblem
+    whose goal is the start state.  Every state generated by one side that
+    the other side has reached closes a path; the search stops when the
+    cheapest node left on the side being expanded cannot beat the best such
+    path, which keeps the result optimal for a consistent heuristic.
+    """
+    problem: SearchProblem
+    start, goal = problem.getStartState(), problem.goal
+    if problem.isGoalState(start):
+        return []
+    reverse = ReverseProblem(problem)
+    heuristics = (lambda state: heuristic(state, problem), lambda state: heuristic(state, reverse))
+    expand = (problem.getSuccessors, problem.getPredecessors)
+    trees = ({start: None}, {goal: None})
+    costs = ({start: 0}, {goal: 0})
+    closed = (set(), set())
+    frontiers = ({start: 0}, {goal: 0})  # Cost of the queued entry for each state on the fringe
+    fringes = (util.PriorityQueue(), util.PriorityQueue())
+    fringes[0].push(start, heuristics[0](start))
+    fringes[1].push(goal, heuristics[1](goal))
+    best, meet = float('inf'), None
+    while frontiers[0] and frontiers[1]:
+        side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        tree, cost, frontier, h = trees[side], costs[side], frontiers[side], heuristics[side]
+        otherCost = costs[1 - side]
+        state = fringes[side].pop()
+        g = frontier.pop(state)
+        if g + h(state) >= best:
+            break
+        closed[side].add(state)
+        for nextState, action, stepCost in expand[side](state):
+            new_cost = g + stepCost
+            if nextState in closed[side] or (nextState in frontier and frontier[nextState] <= new_cost):
+                continue
+            tree[nextState] = (state, action)
+            cost[nextState] = new_cost
+            frontier[nextState] = new_cost
+            fringes[side].update(nextState, new_cost + h(nextState))
+            if nextState in otherCost and new_cost + otherCost[nextState] < best:
+                best, meet = new_cost + otherCost[nextState], nextState
+    if meet is None:
+        return None
+    problem.isGoalState(goal)  # Lets the problem draw the expanded cells
+    return joinPaths(meet, trees[0], trees[1])
+
+
+TRANSPOSITION_TABLE_SIZE = 100000
+SMA_NODE_BUDGET = 100000
+
+
+def iterativeDeepeningAStarSearch(problem, heuristic=nullHeuristic, maxTableSize=TRANSPOSITION_TABLE_SIZE):
+    """
+    Repeat a depth-first search bounded by f = g + h, raising the bound to
+    the smallest f that exceeded it, until a goal is found.  Only the
+    current path and a transposition table of at most maxTableSize states
+    are kept; the table holds the cheapest g at which each state was reached
+    in this iteration so that repeated visits are cut off.
+    """
+    problem: SearchProblem
+    found = object()
+    path = []
+
+    def boundedSearch(start, bound, table):
+        # The depth-first search keeps an explicit stack with, for each
+        # state on the path that is being expanded, its successors still to
+        # search and its g; path holds the actions leading to state
+        smallest = float('inf')
+        stack = []
+        state, g = start, 0
+        while True:
+            f = g + heuristic(state, problem)
+            expanded = False
+            if f > bound:
+                smallest = min(smallest, f)
+            elif problem.isGoalState(state):
+                return found
+            elif table.get(state, float('inf')) > g:
+                if state in table or len(table) < maxTableSize:
+                    table[state] = g
+                stack.append((iter(problem.getSuccessors(state)), g))
+                expanded = True
+            if not expanded and stack:
+                path.pop()
+            # Move on to the next successor, leaving the states that have
+            # none left
+            while stack:
+                successors, parentG = stack[-1]
+                successor = next(successors, None)
+                if successor is not None:
+                    state, action, take_cost = successor
+                    g = parentG + take_cost
+                    path.append(action)
+                    break
+                stack.pop()
+                if stack:
+                    path.pop()
+            else:
+                return smallest
+
+    start = problem.getStartState()
+    bound = heuristic(start, problem)
+    while True:
+        t = boundedSearch(start, bound, {})
+        if t is found:
             return path
-        if state not in closed:
-            closed.add(state)
-            for successor, action, take_cost in problem.getSuccessors(state):
-                new_path = path + [action]
-                new_cost = cost + take_cost
-                fringe.update((successor, new_path, new_cost), new_cost + heuristic(successor, problem))
+        if t == float('inf'):
+            return None
+        bound = t
+
+
+class SMANode:
+    """
+    A search node of simplifiedMemoryBoundedAStarSearch.
+
+    children maps successor states to the child nodes currently held in
+    memory, and forgotten maps the successor states that were dropped to
+    stay within the node budget to their f when they were dropped.
+    """
+
+    def __init__(self, state, parent, action, g, f):
+        self.state = state
+        self.parent = parent
+        self.action = action
+        self.g = g
+        self.f = f
+        self.depth = 0 if parent is None else parent.depth + 1
+        self.children = {}
+        self.forgotten = {}
+        self.expanded = False
+        self.live = True
+        self.version = 0
+
+    def bestForgotten(self):
+        return min(self.forgotten.values(), default=float('inf'))
+
+    def path(self):
+        actions = []
+        node = self
+        while node.parent is not None:
+            actions.append(node.action)
+            node = node.parent
+        actions.reverse()
+        return actions
+
+
+def simplifiedMemoryBoundedAStarSearch(problem, heuristic=nullHeuristic, maxNodes=SMA_NODE_BUDGET,
+                                       maxTableSize=TRANSPOSITION_TABLE_SIZE):
+    """
+    A* that never holds more than maxNodes search nodes (SMA*).
+
+    When the budget is exceeded, the leaf with the highest f is dropped and
+    its f is remembered by its parent, which goes back on the fringe so that
+    the forgotten branch can be regenerated with that f if it becomes the
+    most promising again.  Nodes that are maxNodes - 1 deep and not a goal
+    get an infinite f.  The result is optimal whenever the optimal path fits
+    in the budget.
+
+    As in iterativeDeepeningAStarSearch, a transposition table of at most
+    maxTableSize states holds the cheapest g and depth at which each state
+    was generated, and from which parent.  A successor that was generated
+    as cheaply and as shallowly from another parent is not generated again,
+    otherwise the search would go through every path of equal cost.
+    """
+    problem: SearchProblem
+    inf = float('inf')
+    counter = [0]
+    openHeap, leafHeap = [], []  # Best node to expand, worst leaf to drop
+    liveBest = {}  # Cheapest live node for each state
+    table = {}  # State -> (g, depth, parent state) of its cheapest generation
+
+    def schedule(node):
+        node.version += 1
+        counter[0] += 1
+        if not node.live:
+            return
+        if not node.expanded:
+            heapq.heappush(openHeap, (node.f, -node.depth, counter[0], node.version, node))
+        elif node.forgotten:
+            heapq.heappush(openHeap, (node.bestForgotten(), -node.depth, counter[0], node.version, node))
+        if not node.children and node.parent is not None:
+            heapq.heappush(leafHeap, (-node.f, node.depth, counter[0], node.version, node))
+
+    def compact(heap):
+        heap[:] = [entry for entry in heap if entry[4].live and entry[3] == entry[4].version]
+        heapq.heapify(heap)
+
+    def forget(node):
+        node.live = False
+        parent = node.parent
+        del parent.children[node.state]
+        if liveBest.get(node.state) is node:
+            del liveBest[node.state]
+        if node.f < inf:
+            parent.forgotten[node.state] = node.f
+        if not parent.children:
+            parent.f = parent.bestForgotten()
+        schedule(parent)
+
+    def backUp(node):
+        while node is not None and node.children:
+            best = min(node.bestForgotten(), min(child.f for child in node.children.values()))
+            if best <= node.f:
+                break
+            node.f = best
+            node = node.parent
+
+    start = problem.getStartState()
+    root = SMANode(start, None, None, 0, heuristic(start, problem))
+    liveBest[start] = root
+    table[start] = (0, 0, None)
+    schedule(root)
+    size = 1
+    while openHeap:
+        key, _, _, version, node = heapq.heappop(openHeap)
+        if not node.live or version != node.version:
+            continue
+        if key == inf:
+            return None
+        if not node.expanded and problem.isGoalState(node.state):
+            return node.path()
+
+        ancestors = set()
+        ancestor = node
+        while ancestor is not None:
+            ancestors.add(ancestor.state)
+            ancestor = ancestor.parent
+        # A new node generates all of its successors, a node that lost some
+        # of its children only regenerates the most promising of them
+        regenerating = node.expanded
+        node.expanded = True
+        for successor, action, take_cost in problem.getSuccessors(node.state):
+            g = node.g + take_cost
+            if successor in ancestors or successor in node.children:
+                continue
+            if regenerating:
+                if node.forgotten.get(successor) != key:
+                    continue
+                f = node.forgotten.pop(successor)
+            else:
+                f = max(node.f, g + heuristic(successor, problem))
+            other = liveBest.get(successor)
+            if other is not None and other.g <= g:
+                continue
+            depth = node.depth + 1
+            seen = table.get(successor)
+            if seen is not None and seen[0] <= g and seen[1] <= depth and seen != (g, depth, node.state):
+                continue
+            if (seen is None and len(table) < maxTableSize) or (seen is not None and (g, depth) < seen[:2]):
+                table[successor] = (g, depth, node.state)
+            if depth >= maxNodes - 1 and not problem.isGoalState(successor):
+                f = inf
+            child = SMANode(successor, node, action, g, f)
+            node.children[successor] = child
+            liveBest[successor] = child
+            schedule(child)
+            size += 1
+        if not node.children and not node.forgotten:
+            if node.parent is None:
+                return None
+            node.f = inf
+            forget(node)  # A dead end: nothing below it is worth remembering
+            size -= 1
+        else:
+            if not node.children:
+                node.f = node.bestForgotten()
+                backUp(node.parent)
+            else:
+                backUp(node)
+            schedule(node)
+
+        while size > maxNodes and leafHeap:
+            _, _, _, version, leaf = heapq.heappop(leafHeap)
+            if not leaf.live or version != leaf.version or leaf.children:
+                continue
+            forget(leaf)
+            size -= 1
+        if len(openHeap) > 4 * maxNodes:
+            compact(openHeap)
+        if len(leafHeap) > 4 * maxNodes:
+            compact(leafHeap)
+    return None
+
+
+def jumpPointSearch(problem, heuristic=nullHeuristic):
+    """
+    A* over jump points, for search problems on a 4-connected grid where
+    every step costs 1 (PositionSearchProblem and AnyFoodSearchProblem).
+
+    Instead of queueing every neighbouring cell, each expansion scans in a
+    straight line through problem.walls and only queues the cell where the
+    line must stop: a goal, a cell where an opening appears beside a
+    vertical run, or a cell of a horizontal run from which such a vertical
+    run starts.  Paths are taken horizontally first, so a node reached
+    horizontally continues ahead or turns up or down, and a node reached
+    vertically continues ahead or turns into a forced opening.  Path costs
+    are the same as uniformCostSearch.
+    """
+    from game import Actions
+    problem: SearchProblem
+    walls = problem.walls
+
+    def isOpen(x, y):
+        return 0 <= x < walls.width and 0 <= y < walls.height and not walls[x][y]
+
+    def forced(x, y, dx, dy):
+        # Moving vertically by dy, the cell beside (x, y) on side dx is open
+        # but the one beside the previous cell was a wall
+        return isOpen(x + dx, y) and not isOpen(x + dx, y - dy)
+
+    def jumpVertical(x, y, dy):
+        while True:
+            y += dy
+            if not isOpen(x, y):
+                return None
+            if problem.isGoalState((x, y)):
+                return (x, y)
+            if forced(x, y, -1, dy) or forced(x, y, 1, dy):
+                return (x, y)
+
+    def jumpHorizontal(x, y, dx):
+        while True:
+            x += dx
+            if not isOpen(x, y):
+                return None
+            if problem.isGoalState((x, y)):
+                return (x, y)
+            if jumpVertical(x, y, 1) is not None or jumpVertical(x, y, -1) is not None:
+                return (x, y)
+
+    def directions(state):
+        if tree[state] is None:
+            return None  # The start node looks in every direction
+        x, y = state
+        dx, dy = [int(d) for d in Actions.directionToVector(tree[state][1])]
+        if dx != 0:
+            return [(dx, 0), (0, 1), (0, -1)]
+        return [(0, dy)] + [(dx, 0) for dx in (-1, 1) if forced(x, y, dx, dy)]
+
+    start = problem.getStartState()
+    tree = {start: None}  # Jump point -> (previous jump point, action, steps)
+    closed = set()
+    frontier = {start: 0}
+    fringe = util.PriorityQueue()
+    fringe.push(start, 0)
+    while not fringe.isEmpty():
+        state = fringe.pop()
+        cost = frontier.pop(state)
+        if problem.isGoalState(state):
+            path = []
+            while tree[state] is not None:
+                state, action, steps = tree[state]
+                path.extend([action] * steps)
+            path.reverse()
+            return path
+        closed.add(state)
+        allowed = directions(state)
+        x, y = state
+        for _, action, _ in problem.getSuccessors(state):
+            dx, dy = [int(d) for d in Actions.directionToVector(action)]
+            if allowed is not None and (dx, dy) not in allowed:
+                continue
+            if dx != 0:
+                jumpPoint = jumpHorizontal(x, y, dx)
+            else:
+                jumpPoint = jumpVertical(x, y, dy)
+            if jumpPoint is None:
+                continue
+            steps = abs(jumpPoint[0] - x) + abs(jumpPoint[1] - y)
+            new_cost = cost + steps
+            if jumpPoint in closed or (jumpPoint in frontier and frontier[jumpPoint] <= new_cost):
+                continue
+            tree[jumpPoint] = (state, action, steps)
+            frontier[jumpPoint] = new_cost
+            fringe.update(jumpPoint, new_cost + heuristic(jumpPoint, problem))
+    return None
 
 
 # Abbreviations
@@ -168,3 +659,8 @@ bfs = breadthFirstSearch
 dfs = depthFirstSearch
 astar = aStarSearch
 ucs = uniformCostSearch
+bibfs = bidirectionalBreadthFirstSearch
+biastar = bidirectionalAStarSearch
+idastar = iterativeDeepeningAStarSearch
+smastar = simplifiedMemoryBoundedAStarSearch
+jps = jumpPointSearch
@@ -23,6 +23,10 @@ Good luck and happy searching!
 from game import Directions
 from game import Agent
 from game import Actions
+from game import FoodSet
+from game import getSuccessorTable
+from distanceOracle import getDistanceOracle
+from heuristics import cornersSpanningTreeHeuristic, foodSpanningTreeHeuristic
 import util
 import time
 import search
@@ -142,6 +146,7 @@ class PositionSearchProblem(search.SearchProblem):
         goal: A position in the gameState
         """
         self.walls = gameState.getWalls()
+        self.successorTable = getSuccessorTable(self.walls)
         self.startState = gameState.getPacmanPosition()
         if start != None: self.startState = start
         self.goal = goal
@@ -181,15 +186,8 @@ class PositionSearchProblem(search.SearchProblem):
          cost of expanding to that successor
         """
 
-        successors = []
-        for action in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
-            x, y = state
-            dx, dy = Actions.directionToVector(action)
-            nextx, nexty = int(x + dx), int(y + dy)
-            if not self.walls[nextx][nexty]:
-                nextState = (nextx, nexty)
-                cost = self.costFn(nextState)
-                successors.append((nextState, action, cost))
+        costFn = self.costFn
+        successors = [(nextState, action, costFn(nextState)) for nextState, action in self.successorTable[state]]
 
         # Bookkeeping for display purposes
         self._expanded += 1  # DO NOT CHANGE
@@ -199,6 +197,24 @@ class PositionSearchProblem(search.SearchProblem):
 
         return successors
 
+    def getPredecessors(self, state):
+        """
+        Returns predecessor states, the actions that lead from them to state,
+        and the cost of that step.  This is the reverse successor function
+        used by the bidirectional searches in search.py.
+        """
+
+        cost = self.costFn(state)
+        predecessors = [(prevState, Directions.REVERSE[action], cost) for prevState, action in self.successorTable[state]]
+
+        # Bookkeeping for display purposes
+        self._expanded += 1
+        if state not in self._visited:
+            self._visited[state] = True
+            self._visitedlist.append(state)
+
+        return predecessors
+
     def getCostOfActions(self, actions):
         """
         Returns the cost of a particular sequence of actions. If those actions
@@ -274,6 +290,7 @@ class CornersProblem(search.SearchProblem):
         Stores the walls, pacman's starting position and corners.
         """
         self.walls = startingGameState.getWalls()
+        self.successorTable = getSuccessorTable(self.walls)
         self.startingPosition = startingGameState.getPacmanPosition()
         top, right = self.walls.height - 2, self.walls.width - 2
         self.corners = ((1, 1), (1, top), (right, 1), (right, top))
@@ -284,6 +301,7 @@ class CornersProblem(search.SearchProblem):
         # Please add any code here which you would like to use
         # in initializing the problem
         "*** YOUR CODE HERE ***"
+        self.heuristicInfo = {}  # A dictionary for the heuristic to store information
 
     def getStartState(self):
         """
@@ -312,25 +330,17 @@ class CornersProblem(search.SearchProblem):
         """
 
         successors = []
-        for action in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
-            # Add a successor state to the successor list if the action is legal
-            # Here's a code snippet for figuring out whether a new position hits a wall:
-            #   x,y = currentPosition
-            #   dx, dy = Actions.directionToVector(action)
-            #   nextx, nexty = int(x + dx), int(y + dy)
-            #   hitsWall = self.walls[nextx][nexty]
-
-            "*** YOUR CODE HERE ***"
-            x, y = state[0]
-            dx, dy = Actions.directionToVector(action)
-            nextx, nexty = int(x + dx), int(y + dy)
-            hitsWall = self.walls[nextx][nexty]
+        # Legal moves come precomputed from the successor table shared by
+        # every problem on this layout; see getSuccessorTable.
 
-            if not hitsWall:
-                new_position = (nextx, nexty)
-                new_corners = tuple(corner for corner in state[1] if corner != new_position)
-                new_state = (new_position, new_corners)
-                successors.append((new_state, action, 1))
+        "*** YOUR CODE HERE ***"
+        position, corners = state
+        for new_position, action in self.successorTable[position]:
+            if new_position in corners:
+                new_corners = tuple(corner for corner in corners if corner != new_position)
+            else:
+                new_corners = corners
+            successors.append(((new_position, new_corners), action, 1))
 
         self._expanded += 1  # DO NOT CHANGE
         return successors
@@ -366,10 +376,9 @@ def cornersHeuristic(state, problem):
     walls = problem.walls  # These are the walls of the maze, as a Grid (game.py)
 
     "*** YOUR CODE HERE ***"
-    heuristic = 0
-    for corner in state[1]:
-        heuristic = max(heuristic, util.manhattanDistance(state[0], corner))
-    return heuristic
+    # Spanning tree over the corners left plus the distance to the closest
+    # one; see heuristics.py
+    return cornersSpanningTreeHeuristic(state, problem)
 
 
 class AStarCornersAgent(SearchAgent):
@@ -387,12 +396,14 @@ class FoodSearchProblem:
 
     A search state in this problem is a tuple ( pacmanPosition, foodGrid ) where
       pacmanPosition: a tuple (x,y) of integers specifying Pacman's position
-      foodGrid:       a Grid (see game.py) of either True or False, specifying remaining food
+      foodGrid:       a FoodSet (see game.py) specifying remaining food; it is
+                      indexed like a Grid and supports asList() and count()
     """
 
     def __init__(self, startingGameState):
-        self.start = (startingGameState.getPacmanPosition(), startingGameState.getFood())
+        self.start = (startingGameState.getPacmanPosition(), FoodSet.fromGrid(startingGameState.getFood()))
         self.walls = startingGameState.getWalls()
+        self.successorTable = getSuccessorTable(self.walls)
         self.startingGameState = startingGameState
         self._expanded = 0  # DO NOT CHANGE
         self.heuristicInfo = {}  # A dictionary for the heuristic to store information
@@ -407,14 +418,9 @@ class FoodSearchProblem:
         "Returns successor states, the actions they require, and a cost of 1."
         successors = []
         self._expanded += 1  # DO NOT CHANGE
-        for direction in [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST]:
-            x, y = state[0]
-            dx, dy = Actions.directionToVector(direction)
-            nextx, nexty = int(x + dx), int(y + dy)
-            if not self.walls[nextx][nexty]:
-                nextFood = state[1].copy()
-                nextFood[nextx][nexty] = False
-                successors.append((((nextx, nexty), nextFood), direction, 1))
+        for nextPosition, direction in self.successorTable[state[0]]:
+            nextFood = state[1].eat(nextPosition)
+            successors.append(((nextPosition, nextFood), direction, 1))
         return successors
 
     def getCostOfActions(self, actions):
@@ -453,9 +459,9 @@ def foodHeuristic(state, problem):
     other hand, inadmissible or inconsistent heuristics may find optimal
     solutions, so be careful.
 
-    The state is a tuple ( pacmanPosition, foodGrid ) where foodGrid is a Grid
-    (see game.py) of either True or False. You can call foodGrid.asList() to get
-    a list of food coordinates instead.
+    The state is a tuple ( pacmanPosition, foodGrid ) where foodGrid is a
+    FoodSet (see game.py) that can be indexed like a Grid of True or False.
+    You can call foodGrid.asList() to get a list of food coordinates instead.
 
     If you want access to info like walls, capsules, etc., you can query the
     problem.  For example, problem.walls gives you a Grid of where the walls
@@ -470,11 +476,9 @@ def foodHeuristic(state, problem):
     """
     position, foodGrid = state
     "*** YOUR CODE HERE ***"
-    distance = 0
-    gameState = problem.startingGameState
-    for food in foodGrid.asList():
-        distance = max(distance, mazeDistance(position, food, gameState) )
-    return distance
+    # Spanning tree over the food left plus the distance to the closest dot;
+    # see heuristics.py
+    return foodSpanningTreeHeuristic(state, problem)
 
 
 class ClosestDotSearchAgent(SearchAgent):
@@ -532,6 +536,7 @@ class AnyFoodSearchProblem(PositionSearchProblem):
 
         # Store info for the PositionSearchProblem (no need to change this)
         self.walls = gameState.getWalls()
+        self.successorTable = getSuccessorTable(self.walls)
         self.startState = gameState.getPacmanPosition()
         self.costFn = lambda x: 1
         self._visited, self._visitedlist, self._expanded = {}, [], 0  # DO NOT CHANGE
@@ -548,7 +553,8 @@ class AnyFoodSearchProblem(PositionSearchProblem):
 
 
 def mazeDistance(point1, point2, gameState):
-    x1, y1 = point1
-    x2, y2 = point2
-    prob = PositionSearchProblem(gameState, start=point1, goal=point2, warn=False, visualize=False)
-    return len(search.bfs(prob))
+    """
+    Returns the maze distance between any two points, using the distance
+    oracle shared by every search problem on this layout.
+    """
+    return getDistanceOracle(gameState.getWalls()).getDistance(point1, point2)
@@ -0,0 +1,89 @@
+"""
+This file checks search.simplifiedMemoryBoundedAStarSearch against
+uniformCostSearch on small node budgets.
+
+Usage:
+python smaStarCheck.py [layout ...]
+
+For random start and goal pairs on each layout (openMaze and mediumScaryMaze
+by default), SMA* is run with budgets below and above the length of the
+optimal path.  It must finish within a time limit, and return an optimal
+path or, when the budget is too small for the optimal path, None.
+"""
+
+import random
+import signal
+import sys
+import time
+import layout
+import search
+from game import Actions
+from pacman import GameState
+from searchAgents import PositionSearchProblem, manhattanHeuristic
+
+BUDGETS = [5, 10, 20, 30, 50, 80]
+PAIRS = 50
+TIME_LIMIT = 10  # Seconds per search
+KNOWN_CASES = {  # Pairs that used to make the search run forever
+    'openMaze': [((14, 7), (25, 11))],
+    'mediumScaryMaze': [((32, 8), (1, 1))],
+}
+
+class TimeLimitExceeded(Exception):
+    pass
+
+def onAlarm(signum, frame):
+    raise TimeLimitExceeded()
+
+def makeProblem(gameState, start, goal):
+    return PositionSearchProblem(gameState, start=start, goal=goal, warn=False, visualize=False)
+
+def checkLayout(name, rng):
+    "Returns the failures as (start, goal, budget, reason) tuples"
+    gameState = GameState()
+    gameState.initialize(layout.getLayout(name), 0)
+    cells = gameState.getWalls().asList(False)
+    cases = KNOWN_CASES.get(name, []) + [tuple(rng.sample(cells, 2)) for i in range(PAIRS)]
+    failures = []
+    for start, goal in cases:
+        optimal = len(search.ucs(makeProblem(gameState, start, goal)))
+        for maxNodes in BUDGETS + [optimal + 1]:
+            problem = makeProblem(gameState, start, goal)
+            signal.alarm(TIME_LIMIT)
+            try:
+                path = search.smastar(problem, manhattanHeuristic, maxNodes=maxNodes)
+            except TimeLimitExceeded:
+                failures.append((start, goal, maxNodes, 'no result after %ds' % TIME_LIMIT))
+                continue
+            finally:
+                signal.alarm(0)
+            if path is None:
+                if optimal + 1 <= maxNodes:
+                    failures.append((start, goal, maxNodes, 'None, but the optimal path has %d steps' % optimal))
+            elif problem.getCostOfActions(path) == 999999:
+                failures.append((start, goal, maxNodes, 'illegal path'))
+            elif len(path) != optimal or not problem.isGoalState(walk(start, path)):
+                failures.append((start, goal, maxNodes, '%d steps instead of %d' % (len(path), optimal)))
+    return len(cases) * (len(BUDGETS) + 1), failures
+
+def walk(start, path):
+    "Returns the position reached by following path from start"
+    x, y = start
+    for action in path:
+        dx, dy = Actions.directionToVector(action)
+        x, y = int(x + dx), int(y + dy)
+    return (x, y)
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or ['openMaze', 'mediumScaryMaze']
+    signal.signal(signal.SIGALRM, onAlarm)
+    rng = random.Random(0)
+    failed = False
+    for name in names:
+        begin = time.perf_counter()
+        runs, failures = checkLayout(name, rng)
+        print('%-16s %4d runs  %3d failures  %7.2fs' % (name, runs, len(failures), time.perf_counter() - begin))
+        for failure in failures:
+            print('  %s -> %s, maxNodes=%d: %s' % failure)
+        failed = failed or bool(failures)
+    sys.exit(1 if failed else 0)
@@ -25,6 +25,8 @@ import time
 import os
 import traceback
 import sys
+from itertools import compress
+import random
 
 #######################
 # Parts worth reading #
@@ -171,10 +173,16 @@ class AgentState:
 
 class Grid:
     """
-    A 2-dimensional array of objects backed by a list of lists.  Data is accessed
+    A 2-dimensional array of booleans backed by a bytearray.  Data is accessed
     via grid[x][y] where (x,y) are positions on a Pacman map with x horizontal,
     y vertical and the origin (0,0) in the bottom left corner.
 
+    Cells are stored column by column (cell x * height + y) as bytes that are
+    0 or 1, so grid[x][y] gives 0 or 1, which compare equal to False and True.
+    grid[x] is a memoryview of column x, so grid[x][y] = True writes through.
+    Counting, copying, comparing and packing work on the whole bytearray at
+    once.
+
     The __str__ method constructs an output that is oriented like a pacman board.
     """
 
@@ -185,62 +193,81 @@ class Grid:
 
         self.width = width
         self.height = height
-        self.data = [[initialValue for y in range(
-            height)] for x in range(width)]
+        self.cells = bytearray([initialValue]) * (width * height)
+        self._makeColumns()
         if bitRepresentation:
             self._unpackBits(bitRepresentation)
 
+    def _makeColumns(self):
+        view = memoryview(self.cells)
+        height = self.height
+        self.columns = [view[x * height:(x + 1) * height] for x in range(self.width)]
+
     def __getitem__(self, i):
-        return self.data[i]
+        return self.columns[i]
 
     def __setitem__(self, key, item):
-        self.data[key] = item
+        start = key * self.height
+        self.cells[start:start + self.height] = bytes([bool(value) for value in item])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['columns']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._makeColumns()
 
     def __str__(self):
-        out = [[str(self.data[x][y])[0] for x in range(self.width)]
+        out = [[('F', 'T')[self.cells[x * self.height + y]] for x in range(self.width)]
                for y in range(self.height)]
         out.reverse()
         return '\n'.join([''.join(x) for x in out])
 
     def __eq__(self, other):
-        if other == None:
+        if other is None or not isinstance(other, Grid):
             return False
-        return self.data == other.data
+        return self.width == other.width and self.height == other.height and self.cells == other.cells
 
     def __hash__(self):
-        # return hash(str(self))
-        base = 1
-        h = 0
-        for l in self.data:
-            for i in l:
-                if i:
-                    h += base
-                base *= 2
-        return hash(h)
+        return hash((self.width, self.height, bytes(self.cells)))
 
     def copy(self):
-        g = Grid(self.width, self.height)
-        g.data = [x[:] for x in self.data]
+        g = Grid(0, 0)
+        g.width = self.width
+        g.height = self.height
+        g.cells = bytearray(self.cells)
+        g._makeColumns()
         return g
 
     def deepCopy(self):
         return self.copy()
 
     def shallowCopy(self):
-        g = Grid(self.width, self.height)
-        g.data = self.data
+        g = Grid(0, 0)
+        g.width = self.width
+        g.height = self.height
+        g.cells = self.cells
+        g.columns = self.columns
+        return g
+
+    def withValue(self, x, y, value):
+        """
+        Returns a copy of the grid with (x, y) set to value.
+        """
+        g = self.copy()
+        g.cells[x * self.height + y] = value
         return g
 
     def count(self, item=True):
-        return sum([x.count(item) for x in self.data])
+        return self.cells.count(int(bool(item)))
 
     def asList(self, key=True):
-        list = []
-        for x in range(self.width):
-            for y in range(self.height):
-                if self[x][y] == key:
-                    list.append((x, y))
-        return list
+        cells = self.cells
+        if not key:
+            cells = cells.translate(_NEGATED_VALUES)
+        return list(compress(cellPositions(self.width, self.height), cells))
 
     def packBits(self):
         """
@@ -249,20 +276,17 @@ class Grid:
         (width, height, bitPackedInts...)
         """
         bits = [self.width, self.height]
-        currentInt = 0
-        for i in range(self.height * self.width):
-            bit = self.CELLS_PER_INT - (i % self.CELLS_PER_INT) - 1
-            x, y = self._cellIndexToPosition(i)
-            if self[x][y]:
-                currentInt += 2 ** bit
-            if (i + 1) % self.CELLS_PER_INT == 0:
-                bits.append(currentInt)
-                currentInt = 0
-        bits.append(currentInt)
+        digits = bytes(self.cells).translate(_BINARY_DIGITS)
+        size = self.CELLS_PER_INT
+        for start in range(0, len(digits) - len(digits) % size, size):
+            bits.append(int(digits[start:start + size], 2))
+        rest = digits[len(digits) - len(digits) % size:]
+        # The last int is padded with zero bits on the right
+        bits.append(int(rest, 2) << (size - len(rest)) if rest else 0)
         return tuple(bits)
 
     def _cellIndexToPosition(self, index):
-        x = index / self.height
+        x = index // self.height
         y = index % self.height
         return x, y
 
@@ -270,27 +294,29 @@ class Grid:
         """
         Fills in data from a bit-level representation
         """
-        cell = 0
+        digits = []
         for packed in bits:
-            for bit in self._unpackInt(packed, self.CELLS_PER_INT):
-                if cell == self.width * self.height:
-                    break
-                x, y = self._cellIndexToPosition(cell)
-                self[x][y] = bit
-                cell += 1
-
-    def _unpackInt(self, packed, size):
-        bools = []
-        if packed < 0:
-            raise ValueError("must be a positive integer")
-        for i in range(size):
-            n = 2 ** (self.CELLS_PER_INT - i - 1)
-            if packed >= n:
-                bools.append(True)
-                packed -= n
-            else:
-                bools.append(False)
-        return bools
+            if packed < 0:
+                raise ValueError("must be a positive integer")
+            digits.append(format(packed, '0%db' % self.CELLS_PER_INT)[-self.CELLS_PER_INT:])
+        cells = ''.join(digits).encode()[:self.width * self.height].translate(_BINARY_VALUES)
+        self.cells[:len(cells)] = cells
+
+
+# Translation tables between cell bytes (0 or 1) and the digits '0' and '1'
+_BINARY_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+_BINARY_VALUES = bytes.maketrans(b'01', b'\x00\x01')
+_NEGATED_VALUES = bytes.maketrans(b'\x00\x01', b'\x01\x00')
+
+CELL_POSITIONS_CACHE = {}
+
+
+def cellPositions(width, height):
+    "Returns the (x, y) position of every cell index of a width x height grid"
+    key = width, height
+    if key not in CELL_POSITIONS_CACHE:
+        CELL_POSITIONS_CACHE[key] = tuple([(x, y) for x in range(width) for y in range(height)])
+    return CELL_POSITIONS_CACHE[key]
 
 
 def reconstituteGrid(bitRep):
@@ -393,19 +419,55 @@ class Actions:
     getSuccessor = staticmethod(getSuccessor)
 
 
+# Zobrist hashing: every feature of a state (an agent's configuration, its
+# scared timer, a piece of food, a capsule) gets a random 64 bit key, and a
+# state hashes to the xor of the keys of its features.  Keys are drawn on
+# first use from a private generator so the game's random stream is left
+# alone.
+ZOBRIST_KEYS = {}
+_zobristRandom = random.Random(492)
+
+
+def zobristKey(feature):
+    key = ZOBRIST_KEYS.get(feature)
+    if key is None:
+        key = ZOBRIST_KEYS[feature] = _zobristRandom.getrandbits(64)
+    return key
+
+
+def agentZobristKey(agentIndex, agentState):
+    configuration = agentState.configuration
+    if configuration is None:
+        return 0
+    return zobristKey((agentIndex, configuration.pos, configuration.direction)) ^ \
+        zobristKey((agentIndex, agentState.scaredTimer))
+
+
 class GameStateData:
 
     def __init__(self, prevState=None):
         """
         Generates a new data packet by copying information from its predecessor.
+
+        The food grid, capsule list and agent states are shared with the
+        predecessor rather than copied.  The game rules never change them in
+        place: food and capsules are replaced when something is eaten, and an
+        agent state is copied the first time it changes (see
+        mutableAgentState).
         """
         if prevState != None:
-            self.food = prevState.food.shallowCopy()
-            self.capsules = prevState.capsules[:]
-            self.agentStates = self.copyAgentStates(prevState.agentStates)
+            self.food = prevState.food
+            self.capsules = prevState.capsules
+            self.agentStates = prevState.agentStates[:]
             self.layout = prevState.layout
             self._eaten = prevState._eaten
             self.score = prevState.score
+            self._zobrist = prevState._zobrist
+            # Both packets now refer to the same agent states
+            prevState._ownedAgents = 0
+        else:
+            self._zobrist = None
+        self._ownedAgents = 0
 
         self._foodEaten = None
         self._foodAdded = None
@@ -418,6 +480,9 @@ class GameStateData:
     def deepCopy(self):
         state = GameStateData(self)
         state.food = self.food.deepCopy()
+        state.capsules = self.capsules[:]
+        state.agentStates = self.copyAgentStates(self.agentStates)
+        state._ownedAgents = (1 << len(state.agentStates)) - 1
         state.layout = self.layout.deepCopy()
         state._agentMoved = self._agentMoved
         state._foodEaten = self._foodEaten
@@ -425,6 +490,68 @@ class GameStateData:
         state._capsuleEaten = self._capsuleEaten
         return state
 
+    def shallowCopy(self):
+        """
+        Returns a copy that shares the food grid, capsules, agent states and
+        layout with this packet.  Safe as long as the holder only changes it
+        through the game rules (generateSuccessor), which copy on write.
+        """
+        state = GameStateData(self)
+        state._agentMoved = self._agentMoved
+        state._foodEaten = self._foodEaten
+        state._foodAdded = self._foodAdded
+        state._capsuleEaten = self._capsuleEaten
+        state._lose = self._lose
+        state._win = self._win
+        state.scoreChange = self.scoreChange
+        return state
+
+    def updateHash(self, prevState):
+        """
+        Brings the Zobrist hash inherited from prevState up to date after the
+        rules have been applied: only the agents that changed and the food
+        or capsule eaten contribute.
+        """
+        if prevState._zobrist is None:
+            self._zobrist = None
+            return
+        h = prevState._zobrist
+        owned = self._ownedAgents
+        agentIndex = 0
+        while owned:
+            if owned & 1:
+                h ^= agentZobristKey(agentIndex, prevState.agentStates[agentIndex]) ^ \
+                    agentZobristKey(agentIndex, self.agentStates[agentIndex])
+            owned >>= 1
+            agentIndex += 1
+        if self._foodEaten is not None:
+            h ^= zobristKey(('food',) + tuple(self._foodEaten))
+        if self._capsuleEaten is not None:
+            h ^= zobristKey(('capsule',) + tuple(self._capsuleEaten))
+        self._zobrist = h
+
+    def computeHash(self):
+        "Returns the Zobrist hash of the packet, computed from scratch"
+        h = 0
+        for agentIndex, agentState in enumerate(self.agentStates):
+            h ^= agentZobristKey(agentIndex, agentState)
+        for x, y in self.food.asList():
+            h ^= zobristKey(('food', x, y))
+        for x, y in self.capsules:
+            h ^= zobristKey(('capsule', x, y))
+        return h
+
+    def mutableAgentState(self, agentIndex):
+        """
+        Returns the state of an agent for updating, copying it first if it
+        is shared with another packet.
+        """
+        bit = 1 << agentIndex
+        if not self._ownedAgents & bit:
+            self.agentStates[agentIndex] = self.agentStates[agentIndex].copy()
+            self._ownedAgents |= bit
+        return self.agentStates[agentIndex]
+
     def copyAgentStates(self, agentStates):
         copiedStates = []
         for agentState in agentStates:
@@ -452,17 +579,14 @@ class GameStateData:
         """
         Allows states to be keys of dictionaries.
         """
-        for i, state in enumerate(self.agentStates):
-            try:
-                int(hash(state))
-            except TypeError as e:
-                print(e)
-                # hash(state)
-        return int((hash(tuple(self.agentStates)) + 13*hash(self.food) + 113 * hash(tuple(self.capsules)) + 7 * hash(self.score)) % 1048575)
+        if self._zobrist is None:
+            self._zobrist = self.computeHash()
+        # Spread the score over the high bits too, since hash(-1) == hash(-2)
+        return hash(self._zobrist ^ (int(self.score) * 0x9E3779B97F4A7C15 & 0xFFFFFFFFFFFFFFFF))
 
     def __str__(self):
         width, height = self.layout.width, self.layout.height
-        map = Grid(width, height)
+        map = [[' '] * height for x in range(width)]
         if type(self.food) == type((1, 2)):
             self.food = reconstituteGrid(self.food)
         for x in range(width):
@@ -485,7 +609,9 @@ class GameStateData:
         for x, y in self.capsules:
             map[x][y] = 'o'
 
-        return str(map) + ("\nScore: %d\n" % self.score)
+        rows = [''.join([map[x][y] for x in range(width)]) for y in range(height)]
+        rows.reverse()
+        return '\n'.join(rows) + ("\nScore: %d\n" % self.score)
 
     def _foodWallStr(self, hasFood, hasWall):
         if hasFood:
@@ -535,7 +661,9 @@ class GameStateData:
                     numGhosts += 1
             self.agentStates.append(AgentState(
                 Configuration(pos, Directions.STOP), isPacman))
+        self._ownedAgents = (1 << len(self.agentStates)) - 1
         self._eaten = [False for a in self.agentStates]
+        self._zobrist = self.computeHash()
 
 
 try:
@@ -545,12 +673,77 @@ except:
     _BOINC_ENABLED = False
 
 
+class GameProfile:
+    """
+    Time spent and work done in each phase of a game, per agent.  A phase
+    is timed from the previous call to lap (or start) and charged to the
+    agent whose turn it is.  The counters (successors generated, states
+    hashed, states copied) are bumped by the game state itself while a
+    profile is installed, so they include the work agents do in getAction.
+    """
+    PHASES = ['registerInitialState', 'observation', 'getAction', 'generateSuccessor', 'display', 'rules',
+              'final']
+    COUNTERS = ['successors', 'hashes', 'copies']
+
+    def __init__(self, numAgents):
+        self.numAgents = numAgents
+        self.times = dict((phase, [0.0] * numAgents) for phase in self.PHASES)
+        self.calls = dict((phase, [0] * numAgents) for phase in self.PHASES)
+        self.counts = dict((counter, [0] * numAgents) for counter in self.COUNTERS)
+        self.agentIndex = 0
+        self.lastTime = time.perf_counter()
+
+    def start(self, agentIndex):
+        self.agentIndex = agentIndex
+        self.lastTime = time.perf_counter()
+
+    def lap(self, phase):
+        now = time.perf_counter()
+        self.times[phase][self.agentIndex] += now - self.lastTime
+        self.calls[phase][self.agentIndex] += 1
+        self.lastTime = now
+
+    def count(self, counter):
+        self.counts[counter][self.agentIndex] += 1
+
+    def merge(self, other):
+        "Adds the times and counts of another profile to this one"
+        for table, otherTable in ((self.times, other.times), (self.calls, other.calls),
+                                  (self.counts, other.counts)):
+            for key, values in otherTable.items():
+                for agentIndex, value in enumerate(values):
+                    table[key][agentIndex] += value
+
+    def asDict(self):
+        agents = []
+        for agentIndex in range(self.numAgents):
+            agent = {'agent': agentIndex}
+            for phase in self.PHASES:
+                agent[phase] = {'time': self.times[phase][agentIndex], 'calls': self.calls[phase][agentIndex]}
+            for counter in self.COUNTERS:
+                agent[counter] = self.counts[counter][agentIndex]
+            agents.append(agent)
+        return {'agents': agents}
+
+    def asRows(self):
+        "Returns (agent, metric, value) rows, e.g. (0, 'getAction.time', 0.25)"
+        rows = []
+        for agentIndex in range(self.numAgents):
+            for phase in self.PHASES:
+                rows.append((agentIndex, phase + '.time', self.times[phase][agentIndex]))
+                rows.append((agentIndex, phase + '.calls', self.calls[phase][agentIndex]))
+            for counter in self.COUNTERS:
+                rows.append((agentIndex, counter, self.counts[counter][agentIndex]))
+        return rows
+
+
 class Game:
     """
     The Game manages the control flow, soliciting actions from agents.
     """
 
-    def __init__(self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False):
+    def __init__(self, agents, display, rules, startingIndex=0, muteAgents=False, catchExceptions=False,
+                 fastLoop=False, profile=None):
         self.agentCrashed = False
         self.agents = agents
         self.display = display
@@ -559,6 +752,8 @@ class Game:
         self.gameOver = False
         self.muteAgents = muteAgents
         self.catchExceptions = catchExceptions
+        self.fastLoop = fastLoop
+        self.profile = profile
         self.moveHistory = []
         self.totalAgentTimes = [0 for agent in agents]
         self.totalAgentTimeWarnings = [0 for agent in agents]
@@ -605,8 +800,11 @@ class Game:
         """
         Main control loop for game play.
         """
+        if self.fastLoop:
+            return self.runFast()
         self.display.initialize(self.state.data)
         self.numMoves = 0
+        profile = self.profile
 
         # self.display.initialize(self.state.makeObservation(1).data)
         # inform learning agents of the game start
@@ -621,6 +819,8 @@ class Game:
                 self._agentCrash(i, quiet=True)
                 return
             if ("registerInitialState" in dir(agent)):
+                if profile is not None:
+                    profile.start(i)
                 self.mute(i)
                 if self.catchExceptions:
                     try:
@@ -646,6 +846,8 @@ class Game:
                     agent.registerInitialState(self.state.deepCopy())
                 # TODO: could this exceed the total time
                 self.unmute()
+                if profile is not None:
+                    profile.lap('registerInitialState')
 
         agentIndex = self.startingIndex
         numAgents = len(self.agents)
@@ -655,6 +857,8 @@ class Game:
             agent = self.agents[agentIndex]
             move_time = 0
             skip_action = False
+            if profile is not None:
+                profile.start(agentIndex)
             # Generate an observation of the state
             if 'observationFunction' in dir(agent):
                 self.mute(agentIndex)
@@ -679,6 +883,8 @@ class Game:
                 self.unmute()
             else:
                 observation = self.state.deepCopy()
+            if profile is not None:
+                profile.lap('observation')
 
             # Solicit an action
             action = None
@@ -731,6 +937,8 @@ class Game:
             else:
                 action = agent.getAction(observation)
             self.unmute()
+            if profile is not None:
+                profile.lap('getAction')
 
             # Execute the action
             self.moveHistory.append((agentIndex, action))
@@ -745,14 +953,20 @@ class Game:
                     return
             else:
                 self.state = self.state.generateSuccessor(agentIndex, action)
+            if profile is not None:
+                profile.lap('generateSuccessor')
 
             # Change the display
             self.display.update(self.state.data)
+            if profile is not None:
+                profile.lap('display')
             ###idx = agentIndex - agentIndex % 2 + 1
             ###self.display.update( self.state.makeObservation(idx).data )
 
             # Allow for game specific conditions (winning, losing, etc.)
             self.rules.process(self.state, self)
+            if profile is not None:
+                profile.lap('rules')
             # Track progress
             if agentIndex == numAgents + 1:
                 self.numMoves += 1
@@ -766,9 +980,13 @@ class Game:
         for agentIndex, agent in enumerate(self.agents):
             if "final" in dir(agent):
                 try:
+                    if profile is not None:
+                        profile.start(agentIndex)
                     self.mute(agentIndex)
                     agent.final(self.state)
                     self.unmute()
+                    if profile is not None:
+                        profile.lap('final')
                 except Exception as data:
                     if not self.catchExceptions:
                         raise
@@ -776,3 +994,90 @@ class Game:
                     self.unmute()
                     return
         self.display.finish()
+
+    def runFast(self):
+        """
+        Control loop for trusted agents, used when the game is created with
+        fastLoop=True.
+
+        Agents are handed shallow copies of the state (see
+        GameStateData.shallowCopy) instead of deep copies, their hooks are
+        looked up once, and there are no timeouts: the time each agent takes
+        is only added up in totalAgentTimes.  Exceptions raised by an agent
+        are not caught.
+        """
+        self.display.initialize(self.state.data)
+        self.numMoves = 0
+        profile = self.profile
+        agents = self.agents
+        for i, agent in enumerate(agents):
+            if not agent:
+                print("Agent %d failed to load" % i, file=sys.stderr)
+                self._agentCrash(i, quiet=True)
+                return
+
+        clock = time.perf_counter
+        totalAgentTimes = self.totalAgentTimes
+        moveHistory = self.moveHistory
+        display = self.display
+        rules = self.rules
+        for i, agent in enumerate(agents):
+            registerInitialState = getattr(agent, 'registerInitialState', None)
+            if registerInitialState is not None:
+                if profile is not None:
+                    profile.start(i)
+                self.mute(i)
+                start_time = clock()
+                registerInitialState(self.state.shallowCopy())
+                totalAgentTimes[i] += clock() - start_time
+                self.unmute()
+                if profile is not None:
+                    profile.lap('registerInitialState')
+        observationFunctions = [getattr(agent, 'observationFunction', None) for agent in agents]
+        getActions = [agent.getAction for agent in agents]
+
+        agentIndex = self.startingIndex
+        numAgents = len(agents)
+        while not self.gameOver:
+            if profile is not None:
+                profile.start(agentIndex)
+            self.mute(agentIndex)
+            start_time = clock()
+            observation = self.state.shallowCopy()
+            observationFunction = observationFunctions[agentIndex]
+            if observationFunction is not None:
+                observation = observationFunction(observation)
+            if profile is not None:
+                profile.lap('observation')
+            action = getActions[agentIndex](observation)
+            totalAgentTimes[agentIndex] += clock() - start_time
+            self.unmute()
+            if profile is not None:
+                profile.lap('getAction')
+
+            moveHistory.append((agentIndex, action))
+            self.state = self.state.generateSuccessor(agentIndex, action)
+            if profile is not None:
+                profile.lap('generateSuccessor')
+            display.update(self.state.data)
+            if profile is not None:
+                profile.lap('display')
+            rules.process(self.state, self)
+            if profile is not None:
+                profile.lap('rules')
+            agentIndex = (agentIndex + 1) % numAgents
+
+            if _BOINC_ENABLED:
+                boinc.set_fraction_done(self.getProgress())
+
+        for agentIndex, agent in enumerate(agents):
+            final = getattr(agent, 'final', None)
+            if final is not None:
+                if profile is not None:
+                    profile.start(agentIndex)
+                self.mute(agentIndex)
+                final(self.state)
+                self.unmute()
+                if profile is not None:
+                    profile.lap('final')
+        self.display.finish()
@@ -0,0 +1,246 @@
+# gameRecord.py
+# -------------
+# Licensing Information:  You are free to use or extend these projects for
+# educational purposes provided that (1) you do not distribute or publish
+# solutions, (2) you retain this notice, and (3) you provide clear
+# attribution to UC Berkeley, including a link to http://ai.berkeley.edu.
+#
+# Attribution Information: The Pacman AI projects were developed at UC Berkeley.
+# The core projects and autograders were primarily created by John DeNero
+# (denero@cs.berkeley.edu) and Dan Klein (klein@cs.berkeley.edu).
+# Student side autograding was added by Brad Miller, Nick Hay, and
+# Pieter Abbeel (pabbeel@cs.berkeley.edu).
+
+
+"""
+A compact file format for recorded games, used by pacman.py --record and
+--replay.
+
+Example:
+writer = GameRecordWriter('games.rec')
+writer.addGame(layout, game.moveHistory, len(game.agents))
+writer.close()
+
+reader = GameRecordReader('games.rec')
+game = reader.getGame(3)
+for agentIndex, action in game.actions(): ...
+
+A file holds any number of games.  After a short header come the games,
+one after the other: a 2 byte marker, the first 8 bytes of the SHA-1 of
+the layout text, the number of agents, the number of moves, and then the
+moves at 3 bits each (agents always move in turn starting from Pacman, so
+only the direction is stored).  An index footer with the offset of every game
+makes getGame(n) a seek.  Adding games to an existing file overwrites the
+footer and writes a new one when the writer is closed; a file whose
+footer is missing (the writer never closed) is indexed by scanning it.
+
+Games are read move by move, so a replay never holds the whole file.
+Layouts are found by their hash among the layouts seen by this process
+and the .lay files in the layouts directory.
+"""
+
+import hashlib
+import os
+import struct
+from game import Directions
+import layout as layoutModule
+
+MAGIC = b'PMREC\x01'
+FOOTER_MAGIC = b'PIDX'
+GAME_MAGIC = b'PG'
+GAME_HEADER = struct.Struct('<2s8sBI')
+FOOTER = struct.Struct('<I4s')
+OFFSET = struct.Struct('<Q')
+
+ACTIONS = [Directions.NORTH, Directions.SOUTH, Directions.EAST, Directions.WEST, Directions.STOP]
+ACTION_CODES = dict((action, code) for code, action in enumerate(ACTIONS))
+BITS_PER_MOVE = 3
+# Moves are packed 8 at a time into 3 bytes
+MOVES_PER_GROUP = 8
+BYTES_PER_GROUP = 3
+READ_GROUPS = 1024
+
+LAYOUTS_BY_DIGEST = {}
+
+
+def layoutDigest(layout):
+    """
+    Returns the 8 byte hash a record uses to refer to a layout, and
+    remembers the layout so records of it can be replayed.
+    """
+    digest = hashlib.sha1('\n'.join(layout.layoutText).encode()).digest()[:8]
+    LAYOUTS_BY_DIGEST.setdefault(digest, layout)
+    return digest
+
+
+def findLayout(digest):
+    "Returns the layout with the given hash"
+    if digest not in LAYOUTS_BY_DIGEST:
+        here = os.path.dirname(os.path.abspath(__file__))
+        for directory in ('layouts', os.path.join(here, 'layouts')):
+            if not os.path.isdir(directory):
+                continue
+            for name in sorted(os.listdir(directory)):
+                if name.endswith('.lay'):
+                    layoutDigest(layoutModule.tryToLoad(os.path.join(directory, name)))
+            if digest in LAYOUTS_BY_DIGEST:
+                break
+    if digest not in LAYOUTS_BY_DIGEST:
+        raise Exception('No layout found for recorded game (hash %s)' % digest.hex())
+    return LAYOUTS_BY_DIGEST[digest]
+
+
+def packMoves(actions):
+    "Returns the bytes for a list of actions"
+    packed = bytearray()
+    for start in range(0, len(actions), MOVES_PER_GROUP):
+        group = 0
+        for i, action in enumerate(actions[start:start + MOVES_PER_GROUP]):
+            group |= ACTION_CODES[action] << (BITS_PER_MOVE * i)
+        packed += group.to_bytes(BYTES_PER_GROUP, 'little')
+    return bytes(packed)
+
+
+def readIndex(f):
+    """
+    Returns (offsets, dataEnd) for an open record file: the offset of each
+    game and the offset where the games stop (where the footer starts).
+    """
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    if size >= len(MAGIC) + FOOTER.size:
+        f.seek(size - FOOTER.size)
+        count, magic = FOOTER.unpack(f.read(FOOTER.size))
+        dataEnd = size - FOOTER.size - count * OFFSET.size
+        if magic == FOOTER_MAGIC and dataEnd >= len(MAGIC):
+            f.seek(dataEnd)
+            table = f.read(count * OFFSET.size)
+            return [offset for offset, in OFFSET.iter_unpack(table)], dataEnd
+
+    # No footer: walk the games from the start, stopping at a partly written
+    # game or at what is left of a footer
+    offsets = []
+    offset = len(MAGIC)
+    while offset + GAME_HEADER.size <= size:
+        f.seek(offset)
+        marker, digest, numAgents, numMoves = GAME_HEADER.unpack(f.read(GAME_HEADER.size))
+        end = offset + GAME_HEADER.size + movesLength(numMoves)
+        if marker != GAME_MAGIC or numAgents == 0 or end > size:
+            break
+        offsets.append(offset)
+        offset = end
+    return offsets, offset
+
+
+def movesLength(numMoves):
+    "Returns the number of bytes numMoves packed moves take"
+    return -(-numMoves // MOVES_PER_GROUP) * BYTES_PER_GROUP
+
+
+class GameRecordWriter:
+    """
+    Adds games to a record file, creating it if needed.  The index footer
+    is written by close().
+    """
+
+    def __init__(self, filename):
+        if os.path.exists(filename) and os.path.getsize(filename) > 0:
+            self.file = open(filename, 'r+b')
+            if self.file.read(len(MAGIC)) != MAGIC:
+                self.file.close()
+                raise Exception('%s is not a game record file' % filename)
+            self.offsets, dataEnd = readIndex(self.file)
+            self.file.seek(dataEnd)
+            self.file.truncate()
+        else:
+            self.file = open(filename, 'wb')
+            self.file.write(MAGIC)
+            self.offsets = []
+
+    def addGame(self, layout, moveHistory, numAgents):
+        """
+        Appends a game given its layout and its (agentIndex, action) moves.
+        """
+        for i, (agentIndex, action) in enumerate(moveHistory):
+            if agentIndex != i % numAgents:
+                raise Exception('Agents did not move in turn at move %d' % i)
+        actions = [action for agentIndex, action in moveHistory]
+        self.offsets.append(self.file.tell())
+        self.file.write(GAME_HEADER.pack(GAME_MAGIC, layoutDigest(layout), numAgents, len(actions)))
+        self.file.write(packMoves(actions))
+
+    def close(self):
+        for offset in self.offsets:
+            self.file.write(OFFSET.pack(offset))
+        self.file.write(FOOTER.pack(len(self.offsets), FOOTER_MAGIC))
+        self.file.close()
+
+
+class GameRecordReader:
+    """
+    Reads games from a record file.  Only the index is loaded; the moves of
+    a game are read as they are replayed.
+    """
+
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        if self.file.read(len(MAGIC)) != MAGIC:
+            self.file.close()
+            raise Exception('%s is not a game record file' % filename)
+        self.offsets = readIndex(self.file)[0]
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def getGame(self, index):
+        "Returns the RecordedGame for game number index (from 0)"
+        offset = self.offsets[index]
+        self.file.seek(offset)
+        marker, digest, numAgents, numMoves = GAME_HEADER.unpack(self.file.read(GAME_HEADER.size))
+        return RecordedGame(self.file, offset + GAME_HEADER.size, digest, numAgents, numMoves)
+
+    def __iter__(self):
+        for index in range(len(self.offsets)):
+            yield self.getGame(index)
+
+    def close(self):
+        self.file.close()
+
+
+class RecordedGame:
+    """
+    A game from a record file: its layout hash, number of agents and moves.
+    """
+
+    def __init__(self, f, movesOffset, digest, numAgents, numMoves):
+        self.file = f
+        self.movesOffset = movesOffset
+        self.digest = digest
+        self.numAgents = numAgents
+        self.numMoves = numMoves
+
+    def getLayout(self):
+        return findLayout(self.digest)
+
+    def actions(self):
+        """
+        Yields the (agentIndex, action) moves of the game, reading them from
+        the file a block at a time.
+        """
+        offset = self.movesOffset
+        remaining = self.numMoves
+        move = 0
+        mask = (1 << BITS_PER_MOVE) - 1
+        while remaining > 0:
+            # Seek every time: other games may be read from the same file
+            self.file.seek(offset)
+            block = self.file.read(min(READ_GROUPS * BYTES_PER_GROUP, movesLength(remaining)))
+            if not block:
+                raise Exception('The record file ends in the middle of a game')
+            offset += len(block)
+            for start in range(0, len(block), BYTES_PER_GROUP):
+                group = int.from_bytes(block[start:start + BYTES_PER_GROUP], 'little')
+                for i in range(min(MOVES_PER_GROUP, remaining)):
+                    yield move % self.numAgents, ACTIONS[(group >> (BITS_PER_MOVE * i)) & mask]
+                    move += 1
+                remaining -= MOVES_PER_GROUP
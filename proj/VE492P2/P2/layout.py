@@ -14,11 +14,16 @@
 
 from util import manhattanDistance
 from game import Grid
+from game import Directions
+from array import array
 import os
 import random
-from functools import reduce
 
 VISIBILITY_MATRIX_CACHE = {}
+# Parsed layouts keyed by their text, and layout texts keyed by the
+# (path, modification time) of the file they were read from
+COMPILED_LAYOUT_CACHE = {}
+LAYOUT_FILE_CACHE = {}
 
 
 class Layout:
@@ -29,42 +34,39 @@ class Layout:
     def __init__(self, layoutText):
         self.width = len(layoutText[0])
         self.height = len(layoutText)
-        self.walls = Grid(self.width, self.height, False)
-        self.food = Grid(self.width, self.height, False)
-        self.capsules = []
-        self.agentPositions = []
-        self.numGhosts = 0
-        self.processLayoutText(layoutText)
         self.layoutText = layoutText
-        self.totalFood = len(self.food.asList())
-        # self.initializeVisibilityMatrix()
+        # A text is only parsed the first time it is seen; later layouts
+        # with the same text copy the parsed grids
+        compiled = COMPILED_LAYOUT_CACHE.get(tuple(layoutText))
+        if compiled is None:
+            self.walls = Grid(self.width, self.height, False)
+            self.food = Grid(self.width, self.height, False)
+            self.capsules = []
+            self.agentPositions = []
+            self.numGhosts = 0
+            self.processLayoutText(layoutText)
+            compiled = CompiledLayout(self)
+            COMPILED_LAYOUT_CACHE[tuple(layoutText)] = compiled
+        else:
+            self.walls = compiled.walls.copy()
+            self.food = compiled.food.copy()
+            self.capsules = list(compiled.capsules)
+            self.agentPositions = list(compiled.agentPositions)
+            self.numGhosts = compiled.numGhosts
+        self.totalFood = compiled.totalFood
+        self.legalPositions = compiled.legalPositions
+        self.neighbors = compiled.neighbors
+        self.initializeVisibilityMatrix()
 
     def getNumGhosts(self):
         return self.numGhosts
 
     def initializeVisibilityMatrix(self):
         global VISIBILITY_MATRIX_CACHE
-        if reduce(str.__add__, self.layoutText) not in VISIBILITY_MATRIX_CACHE:
-            from game import Directions
-            vecs = [(-0.5, 0), (0.5, 0), (0, -0.5), (0, 0.5)]
-            dirs = [Directions.NORTH, Directions.SOUTH,
-                    Directions.WEST, Directions.EAST]
-            vis = Grid(self.width, self.height, {Directions.NORTH: set(), Directions.SOUTH: set(
-            ), Directions.EAST: set(), Directions.WEST: set(), Directions.STOP: set()})
-            for x in range(self.width):
-                for y in range(self.height):
-                    if self.walls[x][y] == False:
-                        for vec, direction in zip(vecs, dirs):
-                            dx, dy = vec
-                            nextx, nexty = x + dx, y + dy
-                            while (nextx + nexty) != int(nextx) + int(nexty) or not self.walls[int(nextx)][int(nexty)]:
-                                vis[x][y][direction].add((nextx, nexty))
-                                nextx, nexty = x + dx, y + dy
-            self.visibility = vis
-            VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)] = vis
-        else:
-            self.visibility = VISIBILITY_MATRIX_CACHE[reduce(
-                str.__add__, self.layoutText)]
+        key = tuple(self.layoutText)
+        if key not in VISIBILITY_MATRIX_CACHE:
+            VISIBILITY_MATRIX_CACHE[key] = VisibilityMatrix(self.walls)
+        self.visibility = VISIBILITY_MATRIX_CACHE[key]
 
     def isWall(self, pos):
         x, col = pos
@@ -90,8 +92,8 @@ class Layout:
         return pos
 
     def isVisibleFrom(self, ghostPos, pacPos, pacDirection):
-        row, col = [int(x) for x in pacPos]
-        return ghostPos in self.visibility[row][col][pacDirection]
+        x, y = [int(c) for c in pacPos]
+        return self.visibility.isVisible(ghostPos, x, y, pacDirection)
 
     def __str__(self):
         return "\n".join(self.layoutText)
@@ -137,28 +139,117 @@ class Layout:
             self.numGhosts += 1
 
 
+class CompiledLayout:
+    """
+    The parsed contents of a layout text (walls, food, capsules and agent
+    positions) and data derived from them: the open positions and, for each
+    of them, the open positions next to it.  Shared by every Layout built
+    from the same text.
+    """
+
+    def __init__(self, layout):
+        self.walls = layout.walls.copy()
+        self.food = layout.food.copy()
+        self.capsules = tuple(layout.capsules)
+        self.agentPositions = tuple(layout.agentPositions)
+        self.numGhosts = layout.numGhosts
+        self.totalFood = layout.food.count()
+        self.legalPositions = tuple(self.walls.asList(False))
+        neighbors = {}
+        for x, y in self.legalPositions:
+            neighbors[(x, y)] = tuple(
+                (nextx, nexty) for nextx, nexty in ((x, y + 1), (x, y - 1), (x + 1, y), (x - 1, y))
+                if 0 <= nextx < layout.width and 0 <= nexty < layout.height and not self.walls[nextx][nexty])
+        self.neighbors = neighbors
+
+
+class VisibilityMatrix:
+    """
+    What Pacman can see from each cell when facing each direction: the
+    positions on the ray from the cell up to (not including) the first wall.
+
+    Each direction is stored as one run per cell: an array, indexed by
+    x * height + y, of the coordinate along the ray of the first wall.
+    """
+
+    def __init__(self, walls):
+        self.height = height = walls.height
+        size = walls.width * height
+        # Cells outside the grid count as walls
+        self.north = array('h', [height]) * size
+        self.south = array('h', [-1]) * size
+        self.east = array('h', [walls.width]) * size
+        self.west = array('h', [-1]) * size
+        for x in range(walls.width):
+            column = walls[x]
+            wall = -1
+            for y in range(height):
+                self.south[x * height + y] = wall
+                if column[y]:
+                    wall = y
+            wall = height
+            for y in range(height - 1, -1, -1):
+                self.north[x * height + y] = wall
+                if column[y]:
+                    wall = y
+        for y in range(height):
+            wall = -1
+            for x in range(walls.width):
+                self.west[x * height + y] = wall
+                if walls[x][y]:
+                    wall = x
+            wall = walls.width
+            for x in range(walls.width - 1, -1, -1):
+                self.east[x * height + y] = wall
+                if walls[x][y]:
+                    wall = x
+
+    def isVisible(self, position, x, y, direction):
+        "Returns whether position can be seen from cell (x, y) facing direction"
+        px, py = position
+        cell = x * self.height + y
+        if direction == Directions.NORTH:
+            return px == x and y < py < self.north[cell]
+        if direction == Directions.SOUTH:
+            return px == x and self.south[cell] < py < y
+        if direction == Directions.EAST:
+            return py == y and x < px < self.east[cell]
+        if direction == Directions.WEST:
+            return py == y and self.west[cell] < px < x
+        return False
+
+
 def getLayout(name, back=2):
+    """
+    Loads the layout called name from the layouts directory or the current
+    directory, looking up to back + 1 directories above them as well.
+    """
     if name.endswith('.lay'):
-        layout = tryToLoad('layouts/' + name)
-        if layout == None:
-            layout = tryToLoad(name)
+        candidates = ['layouts/' + name, name]
     else:
-        layout = tryToLoad('layouts/' + name + '.lay')
-        if layout == None:
-            layout = tryToLoad(name + '.lay')
-    if layout == None and back >= 0:
-        curdir = os.path.abspath('.')
-        os.chdir('..')
-        layout = getLayout(name, back - 1)
-        os.chdir(curdir)
-    return layout
+        candidates = ['layouts/' + name + '.lay', name + '.lay']
+    directory = os.path.abspath('.')
+    for level in range(back + 2):
+        for candidate in candidates:
+            layout = tryToLoad(os.path.join(directory, candidate))
+            if layout != None:
+                return layout
+        directory = os.path.dirname(directory)
+    return None
 
 
 def tryToLoad(fullname):
-    if(not os.path.exists(fullname)):
-        return None
-    f = open(fullname)
+    """
+    Loads a layout file, reading it only if it changed since the last time.
+    """
     try:
-        return Layout([line.strip() for line in f])
-    finally:
-        f.close()
+        key = (os.path.abspath(fullname), os.stat(fullname).st_mtime_ns)
+    except OSError:
+        return None
+    if key not in LAYOUT_FILE_CACHE:
+        f = open(fullname)
+        try:
+            LAYOUT_FILE_CACHE[key] = tuple(line.strip() for line in f)
+        finally:
+            f.close()
+    return Layout(list(LAYOUT_FILE_CACHE[key]))
@@ -1,6 +1,7 @@
-from util import manhattanDistance
+from util import manhattanDistance, nearestPoint
 from game import Directions
 import random, util
+import time
 
 from game import Agent
 
@@ -81,6 +82,11 @@ class ReflexAgent(Agent):
         return utility
 
 
+class SearchTimeout(Exception):
+    "Raised inside a search when the time budget for the move runs out"
+    pass
+
+
 def scoreEvaluationFunction(currentGameState):
     """
     This default evaluation function just returns the score of the state.
@@ -107,14 +113,195 @@ class MultiAgentSearchAgent(Agent):
     is another abstract class.
     """
 
-    def __init__(self, evalFn='scoreEvaluationFunction', depth='2'):
+    def __init__(self, evalFn='scoreEvaluationFunction', depth='2', tableSize='0', time='0',
+                 mergeGhosts='0', ghostRadius='0'):
         self.index = 0  # Pacman is always agent index 0
         self.evaluationFunction = util.lookup(evalFn, globals())
         self.depth = int(depth)
+        # With a time budget in seconds (e.g. -a time=0.5,depth=20) each move
+        # is searched by iterative deepening, to at most depth, instead of to
+        # a fixed depth
+        self.timeBudget = float(time)
+        self.deadline = None
+        self.depthLimited = False
+        self.bestMoves = None
+        self.depthsReached = []
+        # With tableSize > 0 (e.g. -a tableSize=100000) search results are
+        # kept in a transposition table shared by all the moves of a game
+        self.table = None
+        if int(tableSize) > 0:
+            self.table = util.TranspositionTable(int(tableSize))
+        # With mergeGhosts (-a mergeGhosts=1) the ghosts are searched as one
+        # opponent choosing a joint move, and with ghostRadius > 0 (which
+        # implies mergeGhosts) only the ghosts within that maze distance of
+        # Pacman move; the others are frozen where they are
+        self.ghostRadius = int(ghostRadius)
+        self.mergeGhosts = int(mergeGhosts) > 0 or self.ghostRadius > 0
+        self.radiusNeighbors = None
+        self.radiusPositions = {}
 
     def is_goal_state(self, state, depth):
-        return state.isWin() or state.isLose() or \
-               depth == self.depth
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+        if state.isWin() or state.isLose():
+            return True
+        if depth == self.depth:
+            self.depthLimited = True
+            return True
+        return False
+
+    def getAction(self, gameState):
+        """
+        Returns the action chosen by searchAction, searching to self.depth,
+        or by iterative deepening when the agent has a time budget.
+        """
+        if self.timeBudget <= 0:
+            return self.searchAction(gameState)
+        return self.iterativeDeepening(gameState)
+
+    def iterativeDeepening(self, gameState):
+        """
+        Searches to depth 1, 2, ... self.depth until the time budget runs out
+        and returns the action of the last search that finished.  The best move
+        found at each node is remembered and tried first by the next, deeper
+        search (see orderActions).  Stops early when a search reached no
+        depth limit, as deeper ones would find the same.
+        """
+        maxDepth = self.depth
+        self.deadline = time.perf_counter() + self.timeBudget
+        self.bestMoves = {}
+        action = None
+        depthReached = 0
+        try:
+            while depthReached < maxDepth:
+                self.depth = depthReached + 1
+                self.depthLimited = False
+                action = self.searchAction(gameState)
+                depthReached += 1
+                if not self.depthLimited:
+                    break
+        except SearchTimeout:
+            pass
+        finally:
+            self.depth = maxDepth
+            self.deadline = None
+            self.bestMoves = None
+        if action is None:
+            action = gameState.getLegalActions(self.index)[0]
+        self.depthsReached.append(depthReached)
+        return action
+
+    def final(self, state):
+        if self.depthsReached:
+            print('Search depth reached per move: %.2f on average, %d to %d (%d moves)' % (
+                sum(self.depthsReached) / float(len(self.depthsReached)), min(self.depthsReached),
+                max(self.depthsReached), len(self.depthsReached)))
+            self.depthsReached = []
+
+    def orderActions(self, state, agent, actions):
+        """
+        Puts the best move found for state by the previous iteration of
+        iterative deepening first.
+        """
+        if self.bestMoves is None:
+            return actions
+        best = self.bestMoves.get((state, agent))
+        if best is None or best not in actions:
+            return actions
+        return [best] + [action for action in actions if action != best]
+
+    def recordBestMove(self, state, agent, action):
+        if self.bestMoves is not None and action is not None:
+            self.bestMoves[(state, agent)] = action
+
+    def movingGhosts(self, state):
+        """
+        Returns the ghosts that move in a merged ghost turn from state: all
+        of them, or those within ghostRadius of Pacman by maze distance.
+        """
+        ghosts = range(1, state.getNumAgents())
+        if self.ghostRadius <= 0:
+            return list(ghosts)
+        near = self.positionsWithinRadius(state)
+        return [ghost for ghost in ghosts if nearestPoint(state.getGhostPosition(ghost)) in near]
+
+    def positionsWithinRadius(self, state):
+        """
+        Returns the set of positions within ghostRadius steps of Pacman,
+        found by a breadth first search that is cached per position.
+        """
+        neighbors = state.data.layout.neighbors
+        if neighbors is not self.radiusNeighbors:
+            self.radiusNeighbors = neighbors
+            self.radiusPositions = {}
+        position = nearestPoint(state.getPacmanPosition())
+        if position not in self.radiusPositions:
+            near = set([position])
+            frontier = [position]
+            for step in range(self.ghostRadius):
+                frontier = [nextPosition for current in frontier for nextPosition in neighbors[current]
+                            if nextPosition not in near]
+                near.update(frontier)
+            self.radiusPositions[position] = near
+        return self.radiusPositions[position]
+
+    def ghostSuccessors(self, state):
+        """
+        Yields (probability, successor) for each joint move of the moving
+        ghosts, each ghost choosing uniformly at random.  A joint move stops
+        early if a ghost ends the game, and the state itself is the only
+        successor when no ghost moves.
+        """
+
+        def jointMoves(state, ghosts, probability):
+            if not ghosts or state.isWin() or state.isLose():
+                yield probability, state
+                return
+            actions = state.getLegalActions(ghosts[0])
+            for action in actions:
+                for move in jointMoves(state.generateSuccessor(ghosts[0], action), ghosts[1:],
+                                       probability / len(actions)):
+                    yield move
+
+        return jointMoves(state, self.movingGhosts(state), 1.0)
+
+    def lookupValue(self, state, agent, depth, alpha=-float('inf'), beta=float('inf')):
+        """
+        Returns the value of state with agent to move stored in the
+        transposition table, if it is exact or a bound that already causes a
+        cutoff in the window (alpha, beta), and None otherwise.
+
+        Entries are keyed by the depth still to be searched, so they stay
+        valid from one move to the next.
+        """
+        if self.table is None:
+            return None
+        entry = self.table.get((state, agent, self.depth - depth))
+        if entry is None:
+            return None
+        value, bound = entry
+        if bound == util.TranspositionTable.EXACT or \
+                (bound == util.TranspositionTable.LOWER and value > beta) or \
+                (bound == util.TranspositionTable.UPPER and value < alpha):
+            # The subtree skipped may have reached the depth limit
+            self.depthLimited = True
+            return value
+        return None
+
+    def storeValue(self, state, agent, depth, value, alpha=-float('inf'), beta=float('inf')):
+        """
+        Stores the value found for state by a search with window (alpha,
+        beta) at entry: a value outside the window is only a bound.
+        """
+        if self.table is None:
+            return
+        if value <= alpha:
+            bound = util.TranspositionTable.UPPER
+        elif value >= beta:
+            bound = util.TranspositionTable.LOWER
+        else:
+            bound = util.TranspositionTable.EXACT
+        self.table.put((state, agent, self.depth - depth), value, bound)
 
 
 class MinimaxAgent(MultiAgentSearchAgent):
@@ -122,7 +309,7 @@ class MinimaxAgent(MultiAgentSearchAgent):
     Your minimax agent (question 2)
     """
 
-    def getAction(self, gameState):
+    def searchAction(self, gameState):
         """
         Returns the minimax action from the current gameState using self.depth
         and self.evaluationFunction.
@@ -155,43 +342,149 @@ class MinimaxAgent(MultiAgentSearchAgent):
         def max_value(agent, state, depth):
             if self.is_goal_state(state, depth):
                 return self.evaluationFunction(state)
+            value = self.lookupValue(state, agent, depth)
+            if value is not None:
+                return value
             actions = state.getLegalActions(agent)
             agent_number = state.getNumAgents()
-            return max([min_value(next_agent(agent, agent_number), state.generateSuccessor(agent, action), depth)
-                        for action in actions])
+            value = max([min_value(next_agent(agent, agent_number), state.generateSuccessor(agent, action), depth)
+                         for action in actions])
+            self.storeValue(state, agent, depth, value)
+            return value
 
         def min_value(agent, state, depth):
             if self.is_goal_state(state, depth):
                 return self.evaluationFunction(state)
+            value = self.lookupValue(state, agent, depth)
+            if value is not None:
+                return value
             actions = state.getLegalActions(agent)
             agent_number = state.getNumAgents()
 
-            if next_agent(agent, agent_number) == pacman_agent:
-                return min(
+            if self.mergeGhosts:
+                value = min([max_value(pacman_agent, successor, depth + 1)
+                             for probability, successor in self.ghostSuccessors(state)])
+            elif next_agent(agent, agent_number) == pacman_agent:
+                value = min(
                     [max_value(pacman_agent, state.generateSuccessor(agent, action), depth + 1) for action in actions])
             else:
-                return min(
+                value = min(
                     [min_value(next_agent(agent, agent_number), state.generateSuccessor(agent, action), depth) for
                      action in actions])
+            self.storeValue(state, agent, depth, value)
+            return value
 
-        return max(gameState.getLegalActions(pacman_agent), key=lambda action: min_value(next_agent(pacman_agent,
-                                                                                                    gameState.getNumAgents()),
-                                                                                         gameState.generateSuccessor(
-                                                                                             pacman_agent, action),
-                                                                                         initial_depth))
+        action = max(self.orderActions(gameState, pacman_agent, gameState.getLegalActions(pacman_agent)),
+                     key=lambda action: min_value(next_agent(pacman_agent, gameState.getNumAgents()),
+                                                  gameState.generateSuccessor(pacman_agent, action), initial_depth))
+        self.recordBestMove(gameState, pacman_agent, action)
+        return action
 
 
 class AlphaBetaAgent(MultiAgentSearchAgent):
     """
     Your minimax agent with alpha-beta pruning (question 3)
+
+    With ordering (-a ordering=1) the moves at each node are tried best
+    first: the principal variation move (when iterative deepening), then
+    the killer moves that caused cutoffs at the same ply, then by the
+    history table of cutoffs per (agent, position, action), then, two or
+    more plies from the depth limit, by the evaluation of the successors.
+    nodesSearched, cutoffs and movesPruned count the work saved, and are
+    printed at the end of each game.
     """
 
-    def getAction(self, gameState):
+    def __init__(self, ordering='0', **args):
+        MultiAgentSearchAgent.__init__(self, **args)
+        self.ordering = int(ordering) > 0
+        self.killers = {}
+        self.history = {}
+        self.lastRoot = None
+        self.nodesSearched = 0
+        self.cutoffs = 0
+        self.movesPruned = 0
+
+    def agentPosition(self, state, agent):
+        if agent == 0:
+            return state.getPacmanPosition()
+        return state.getGhostPosition(agent)
+
+    def orderMoves(self, state, agent, depth, maximize):
+        """
+        Returns the (action, successor) pairs to search at a node, in the
+        order to search them.  The successor is None when it has not been
+        generated yet.
+        """
+        if not self.ordering:
+            return [(action, None) for action in self.orderActions(state, agent, state.getLegalActions(agent))]
+        actions = state.getLegalActions(agent)
+        first = None
+        if self.bestMoves is not None:
+            first = self.bestMoves.get((state, agent))
+        killers = self.killers.get(depth * state.getNumAgents() + agent, ())
+        scores = self.history.get((agent, self.agentPosition(state, agent)), {})
+        successors = {}
+        static = {}
+        # Evaluating every successor only pays off high in the tree, and
+        # not when there is a principal variation move, which usually
+        # causes a cutoff by itself
+        if first is None and self.depth - depth >= 2:
+            sign = 1 if maximize else -1
+            for action in actions:
+                successors[action] = state.generateSuccessor(agent, action)
+                static[action] = sign * self.evaluationFunction(successors[action])
+
+        def moveKey(action):
+            return action == first, action in killers, scores.get(action, 0), static.get(action, 0)
+        return [(action, successors.get(action)) for action in sorted(actions, key=moveKey, reverse=True)]
+
+    def recordCutoff(self, state, agent, depth, action, skipped):
+        "Notes that action caused a cutoff with skipped moves left unsearched"
+        self.cutoffs += 1
+        self.movesPruned += skipped
+        if not self.ordering:
+            return
+        killers = self.killers.setdefault(depth * state.getNumAgents() + agent, [])
+        if action not in killers:
+            killers.insert(0, action)
+            del killers[2:]
+        scores = self.history.setdefault((agent, self.agentPosition(state, agent)), {})
+        scores[action] = scores.get(action, 0) + (self.depth - depth) ** 2
+
+    def final(self, state):
+        if self.ordering:
+            print('Alpha-beta search: %d nodes, %d cutoffs, %d moves pruned' % (
+                self.nodesSearched, self.cutoffs, self.movesPruned))
+        self.nodesSearched = 0
+        self.cutoffs = 0
+        self.movesPruned = 0
+        MultiAgentSearchAgent.final(self, state)
+
+    def startSearch(self, gameState):
+        """
+        Forgets the killer moves and halves the history scores when the
+        search is for a new move, rather than a deeper iteration of the
+        same one.
+        """
+        if gameState is self.lastRoot:
+            return
+        self.lastRoot = gameState
+        self.killers = {}
+        for key, scores in list(self.history.items()):
+            for action in list(scores):
+                scores[action] //= 2
+                if not scores[action]:
+                    del scores[action]
+            if not scores:
+                del self.history[key]
+
+    def searchAction(self, gameState):
         """
         Returns the minimax action using self.depth and self.evaluationFunction
         """
         "*** YOUR CODE HERE ***"
         pacman_agent = 0
+        self.startSearch(gameState)
 
         def next_agent(agent, agent_number):
             return (agent + 1) % agent_number
@@ -199,64 +492,123 @@ class AlphaBetaAgent(MultiAgentSearchAgent):
         def max_value(agent, state, depth, alpha, beta):
             if self.is_goal_state(state, depth):
                 return self.evaluationFunction(state)
-            actions = state.getLegalActions(agent)
+            value = self.lookupValue(state, agent, depth, alpha, beta)
+            if value is not None:
+                return value
+            self.nodesSearched += 1
+            window = alpha, beta
+            moves = self.orderMoves(state, agent, depth, True)
             agent_number = state.getNumAgents()
             value = -float('inf')
-            for action in actions:
-                next_state = state.generateSuccessor(agent, action)
-                value = max(value, min_value(next_agent(agent, agent_number), next_state, depth, alpha, beta))
+            best_action = None
+            for index, (action, next_state) in enumerate(moves):
+                if next_state is None:
+                    next_state = state.generateSuccessor(agent, action)
+                action_value = min_value(next_agent(agent, agent_number), next_state, depth, alpha, beta)
+                if action_value > value:
+                    value = action_value
+                    best_action = action
                 if value > beta:
-                    return value
+                    self.recordCutoff(state, agent, depth, action, len(moves) - index - 1)
+                    break
                 alpha = max(alpha, value)
+            self.recordBestMove(state, agent, best_action)
+            self.storeValue(state, agent, depth, value, *window)
             return value
 
         def min_value(agent, state, depth, alpha, beta):
             if self.is_goal_state(state, depth):
                 return self.evaluationFunction(state)
-            actions = state.getLegalActions(agent)
-            agent_number = state.getNumAgents()
-            value = float('inf')
-            if next_agent(agent, agent_number) == pacman_agent:
-                for action in actions:
-                    next_state = state.generateSuccessor(agent, action)
-                    value = min(value, max_value(next_agent(agent, agent_number), next_state, depth + 1, alpha, beta))
+            value = self.lookupValue(state, agent, depth, alpha, beta)
+            if value is not None:
+                return value
+            self.nodesSearched += 1
+            window = alpha, beta
+            if self.mergeGhosts:
+                value = float('inf')
+                for probability, next_state in self.ghostSuccessors(state):
+                    value = min(value, max_value(pacman_agent, next_state, depth + 1, alpha, beta))
                     if value < alpha:
-                        return value
+                        self.cutoffs += 1
+                        break
                     beta = min(value, beta)
-            else:
-                for action in actions:
+                self.storeValue(state, agent, depth, value, *window)
+                return value
+            moves = self.orderMoves(state, agent, depth, False)
+            agent_number = state.getNumAgents()
+            value = float('inf')
+            best_action = None
+            for index, (action, next_state) in enumerate(moves):
+                if next_state is None:
                     next_state = state.generateSuccessor(agent, action)
-                    value = min(value, min_value(next_agent(agent, agent_number), next_state, depth, alpha, beta))
-                    if value < alpha:
-                        return value
-                    beta = min(value, beta)
+                if next_agent(agent, agent_number) == pacman_agent:
+                    action_value = max_value(pacman_agent, next_state, depth + 1, alpha, beta)
+                else:
+                    action_value = min_value(next_agent(agent, agent_number), next_state, depth, alpha, beta)
+                if action_value < value:
+                    value = action_value
+                    best_action = action
+                if value < alpha:
+                    self.recordCutoff(state, agent, depth, action, len(moves) - index - 1)
+                    break
+                beta = min(value, beta)
+            self.recordBestMove(state, agent, best_action)
+            self.storeValue(state, agent, depth, value, *window)
             return value
 
-        initial_actions = gameState.getLegalActions(pacman_agent)
-        taken_action = initial_actions[0]
+        initial_moves = self.orderMoves(gameState, pacman_agent, 0, True)
+        taken_action = initial_moves[0][0]
         initial_value = -float('inf')
         initial_depth = 0
         initial_alpha = -float('inf')
         initial_beta = float('inf')
-        for first_action in initial_actions:
+        for first_action, first_state in initial_moves:
+            if first_state is None:
+                first_state = gameState.generateSuccessor(pacman_agent, first_action)
             action_successor_value = min_value(next_agent(pacman_agent, gameState.getNumAgents()),
-                                               gameState.generateSuccessor(pacman_agent, first_action), initial_depth,
-                                               initial_alpha, initial_beta)
+                                               first_state, initial_depth, initial_alpha, initial_beta)
             if initial_value < action_successor_value:
                 taken_action = first_action
                 initial_value = action_successor_value
             if initial_value > initial_beta:
                 return initial_value, taken_action
             initial_alpha = max(initial_value, initial_alpha)
+        self.recordBestMove(gameState, pacman_agent, taken_action)
         return taken_action
 
 
 class ExpectimaxAgent(MultiAgentSearchAgent):
     """
       Your expectimax agent (question 4)
+
+    With star=1 or star=2 and evalRange (e.g. -a star=2,evalRange=600)
+    evaluations are clamped to within evalRange of the evaluation of the
+    current state, and chance nodes are pruned by Star1, or by Star2, which
+    first probes one move of each child.  With samples=k only k of the ghost
+    moves are searched at each chance node, chosen at random.  Both use
+    starSearchAction; nodesSearched and cutoffs count its work and are
+    printed at the end of each game.
     """
 
-    def getAction(self, gameState):
+    def __init__(self, star='0', evalRange='0', samples='0', **args):
+        MultiAgentSearchAgent.__init__(self, **args)
+        self.star = int(star)
+        self.evalRange = float(evalRange)
+        if self.star and self.evalRange <= 0:
+            raise Exception('Star pruning needs a bounded evaluation range (-a evalRange=...)')
+        self.samples = int(samples)
+        self.lastRoot = None
+        self.nodesSearched = 0
+        self.cutoffs = 0
+
+    def final(self, state):
+        if self.star or self.samples:
+            print('Expectimax search: %d nodes, %d cutoffs' % (self.nodesSearched, self.cutoffs))
+        self.nodesSearched = 0
+        self.cutoffs = 0
+        MultiAgentSearchAgent.final(self, state)
+
+    def searchAction(self, gameState):
         """
         Returns the expectimax action using self.depth and self.evaluationFunction
 
@@ -264,6 +616,8 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
         legal moves.
         """
         "*** YOUR CODE HERE ***"
+        if self.star or self.samples:
+            return self.starSearchAction(gameState)
         pacman_agent = 0
         initial_depth = 0
 
@@ -273,14 +627,28 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
         def max_value(agent, state, depth):
             if self.is_goal_state(state, depth):
                 return self.evaluationFunction(state)
+            value = self.lookupValue(state, agent, depth)
+            if value is not None:
+                return value
             actions = state.getLegalActions(agent)
             agent_number = state.getNumAgents()
-            return max([expected_value(next_agent(agent, agent_number), state.generateSuccessor(agent, action), depth)
-                        for action in actions])
+            value = max([expected_value(next_agent(agent, agent_number), state.generateSuccessor(agent, action), depth)
+                         for action in actions])
+            self.storeValue(state, agent, depth, value)
+            return value
 
         def expected_value(agent, state, depth):
             if self.is_goal_state(state, depth):
                 return self.evaluationFunction(state)
+            value = self.lookupValue(state, agent, depth)
+            if value is not None:
+                return value
+            if self.mergeGhosts:
+                expectation = 0
+                for probability, successor in self.ghostSuccessors(state):
+                    expectation += probability * max_value(pacman_agent, successor, depth + 1)
+                self.storeValue(state, agent, depth, expectation)
+                return expectation
             actions = state.getLegalActions(agent)
             agent_number = state.getNumAgents()
             probability = 1.0 / len(actions)
@@ -292,11 +660,197 @@ class ExpectimaxAgent(MultiAgentSearchAgent):
             else:
                 for successor in successors:
                     expectation += probability * expected_value(next_agent(agent, agent_number), successor, depth)
+            self.storeValue(state, agent, depth, expectation)
             return expectation
 
-        return max(gameState.getLegalActions(pacman_agent),
-                   key=lambda action: expected_value(next_agent(pacman_agent, gameState.getNumAgents()),
-                                                     gameState.generateSuccessor(pacman_agent, action), initial_depth))
+        action = max(self.orderActions(gameState, pacman_agent, gameState.getLegalActions(pacman_agent)),
+                     key=lambda action: expected_value(next_agent(pacman_agent, gameState.getNumAgents()),
+                                                       gameState.generateSuccessor(pacman_agent, action),
+                                                       initial_depth))
+        self.recordBestMove(gameState, pacman_agent, action)
+        return action
+
+    def chanceMoves(self, state, agent):
+        """
+        Returns the moves searched at a chance node as [probability, action,
+        successor] lists; the successor is None until it is generated.  The
+        action is None for merged ghost moves, whose successors are
+        generated here.
+        """
+        if self.mergeGhosts:
+            if not self.samples:
+                return [[probability, None, successor] for probability, successor in self.ghostSuccessors(state)]
+            ghosts = self.movingGhosts(state)
+            if not ghosts:
+                return [[1.0, None, state]]
+            moves = []
+            for sample in range(self.samples):
+                successor = state
+                for ghost in ghosts:
+                    if successor.isWin() or successor.isLose():
+                        break
+                    successor = successor.generateSuccessor(ghost, random.choice(successor.getLegalActions(ghost)))
+                moves.append([1.0 / self.samples, None, successor])
+            return moves
+        actions = state.getLegalActions(agent)
+        if 0 < self.samples < len(actions):
+            actions = random.sample(actions, self.samples)
+        return [[1.0 / len(actions), action, None] for action in actions]
+
+    def starSearchAction(self, gameState):
+        """
+        Returns the expectimax action found by a search with a window
+        (alpha, beta) at every node.  With star pruning a chance node stops
+        as soon as the bounds on its value, from the values of the children
+        searched so far and the evaluation range for the others, fall
+        outside its window.  Star2 first probes the first move of each child
+        (Pacman) node, whose value is a lower bound on the child's.
+        """
+        pacman_agent = 0
+        if self.star:
+            rootValue = self.evaluationFunction(gameState)
+            lower, upper = rootValue - self.evalRange, rootValue + self.evalRange
+            # The range moves with the root, so stored values are only valid
+            # for the searches of this move
+            if self.table is not None and gameState is not self.lastRoot:
+                self.table.clear()
+            self.lastRoot = gameState
+        else:
+            lower, upper = -float('inf'), float('inf')
+
+        def evaluate(state):
+            return min(upper, max(lower, self.evaluationFunction(state)))
+
+        def store_value(*args):
+            # Sampled values are estimates, so they are not kept in the table
+            # for other searches to take as exact
+            if not self.samples:
+                self.storeValue(*args)
+
+        def max_value(state, depth, alpha, beta, probe=None):
+            if self.is_goal_state(state, depth):
+                return evaluate(state)
+            value = self.lookupValue(state, pacman_agent, depth, alpha, beta)
+            if value is not None:
+                return value
+            self.nodesSearched += 1
+            window = alpha, beta
+            value = -float('inf')
+            best_action = None
+            for index, action in enumerate(self.orderActions(state, pacman_agent,
+                                                             state.getLegalActions(pacman_agent))):
+                if index == 0 and probe is not None and (probe[0] < probe[1] or probe[0] >= beta):
+                    # The probe of the first move already gave its value, or
+                    # a lower bound high enough for a cutoff
+                    action_value = probe[0]
+                else:
+                    action_value = chance_value(1, state.generateSuccessor(pacman_agent, action), depth, alpha,
+                                                beta)
+                if action_value > value:
+                    value = action_value
+                    best_action = action
+                if value >= beta:
+                    self.cutoffs += 1
+                    break
+                alpha = max(alpha, value)
+            self.recordBestMove(state, pacman_agent, best_action)
+            store_value(state, pacman_agent, depth, value, *window)
+            return value
+
+        def probe_value(state, depth, beta):
+            """
+            Returns a lower bound on the value of a Pacman node: the value of
+            its first move, searched with window (lower, beta).
+            """
+            if self.is_goal_state(state, depth):
+                return evaluate(state)
+            action = self.orderActions(state, pacman_agent, state.getLegalActions(pacman_agent))[0]
+            # Searched with alpha at the bottom of the range, the value of the
+            # move is exact or a lower bound
+            return chance_value(1, state.generateSuccessor(pacman_agent, action), depth, lower, beta)
+
+        def chance_value(agent, state, depth, alpha, beta):
+            if self.is_goal_state(state, depth):
+                return evaluate(state)
+            value = self.lookupValue(state, agent, depth, alpha, beta)
+            if value is not None:
+                return value
+            self.nodesSearched += 1
+            window = alpha, beta
+            if self.mergeGhosts or agent + 1 == state.getNumAgents():
+                next_agent, next_depth = pacman_agent, depth + 1
+            else:
+                next_agent, next_depth = agent + 1, depth
+            moves = self.chanceMoves(state, agent)
+            probes = [None] * len(moves)
+
+            def successor(move):
+                if move[2] is None:
+                    move[2] = state.generateSuccessor(agent, move[1])
+                return move[2]
+
+            def child_value(index, move, alpha, beta):
+                if next_agent == pacman_agent:
+                    return max_value(successor(move), next_depth, alpha, beta, probes[index])
+                return chance_value(next_agent, successor(move), next_depth, alpha, beta)
+
+            if not self.star:
+                value = sum(move[0] * child_value(index, move, alpha, beta) for index, move in enumerate(moves))
+                store_value(state, agent, depth, value)
+                return value
+
+            # Lower bounds on the values of the children, and their sum
+            # weighted by probability
+            bounds = [lower] * len(moves)
+            rest = sum(move[0] for move in moves)
+            lower_sum = rest * lower
+            if self.star == 2 and next_agent == pacman_agent:
+                for index, move in enumerate(moves):
+                    probability = move[0]
+                    probe_beta = min(upper, (beta - lower_sum + probability * bounds[index]) / probability)
+                    bound = probe_value(successor(move), next_depth, probe_beta)
+                    probes[index] = bound, probe_beta
+                    if bound > bounds[index]:
+                        lower_sum += probability * (bound - bounds[index])
+                        bounds[index] = bound
+                    if lower_sum >= beta:
+                        self.cutoffs += 1
+                        store_value(state, agent, depth, lower_sum, *window)
+                        return lower_sum
+
+            # Star1: each child is searched with the window outside of which
+            # the bounds on this node's value cause a cutoff
+            total = 0
+            for index, move in enumerate(moves):
+                probability = move[0]
+                rest -= probability
+                lower_sum -= probability * bounds[index]
+                child_alpha = (alpha - total - rest * upper) / probability
+                child_beta = (beta - total - lower_sum) / probability
+                child = child_value(index, move, max(lower, child_alpha), min(upper, child_beta))
+                total += probability * child
+                if child <= child_alpha:
+                    value = total + rest * upper
+                    break
+                if child >= child_beta:
+                    value = total + lower_sum
+                    break
+            else:
+                store_value(state, agent, depth, total, *window)
+                return total
+            self.cutoffs += 1
+            store_value(state, agent, depth, value, *window)
+            return value
+
+        taken_action = None
+        best_value = -float('inf')
+        for action in self.orderActions(gameState, pacman_agent, gameState.getLegalActions(pacman_agent)):
+            value = chance_value(1, gameState.generateSuccessor(pacman_agent, action), 0, best_value, float('inf'))
+            if taken_action is None or value > best_value:
+                taken_action = action
+                best_value = value
+        self.recordBestMove(gameState, pacman_agent, taken_action)
+        return taken_action
 
 
 def betterEvaluationFunction(currentGameState):
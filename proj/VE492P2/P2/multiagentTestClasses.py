@@ -42,6 +42,9 @@ import autograder
 
 VERBOSE = False
 
+# The grading agents below check how many states a student agent explores
+GameState.setExploredTracking('set')
+
 
 class MultiagentTreeState(object):
     def __init__(self, problem, state):
@@ -43,6 +43,8 @@ from game import GameStateData
 from game import Game
 from game import Directions
 from game import Actions
+from game import Configuration
+from game import GameProfile
 from util import nearestPoint
 from util import manhattanDistance
 import util
@@ -58,6 +60,23 @@ import os
 ###################################################
 
 
+class ExploredCounter:
+    """
+    Stands in for the explored set when only the number of states matters.
+    It counts every state added, including repeats, and holds on to none of
+    them, so its memory use does not grow.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def add(self, state):
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+
 class GameState:
     """
     A GameState specifies the full game state, including the food, capsules,
@@ -77,12 +96,36 @@ class GameState:
     # Accessor methods: use these to access state data #
     ####################################################
 
-    # static variable keeps track of which states have had getLegalActions called
-    explored = set()
+    # static variable keeps track of which states have had getLegalActions called.
+    # Tracking costs a hash of every state generated, so it is off unless
+    # turned on with setExploredTracking (the autograder does, to count the
+    # states an agent explores)
+    explored = None
+    # The GameProfile of the game being profiled, which counts the states
+    # generated, hashed and copied
+    profile = None
+
+    def setExploredTracking(mode='set'):
+        """
+        mode is 'set' to keep every state generated (what getAndResetExplored
+        returns), 'count' to keep only an ExploredCounter, or None to stop
+        tracking.
+        """
+        if mode == 'set':
+            GameState.explored = set()
+        elif mode == 'count':
+            GameState.explored = ExploredCounter()
+        elif mode is None:
+            GameState.explored = None
+        else:
+            raise Exception('Unknown explored tracking mode ' + str(mode))
+    setExploredTracking = staticmethod(setExploredTracking)
 
     def getAndResetExplored():
-        tmp = GameState.explored.copy()
-        GameState.explored = set()
+        tmp = GameState.explored
+        if tmp is None:
+            return set()
+        GameState.explored = tmp.__class__()
         return tmp
     getAndResetExplored = staticmethod(getAndResetExplored)
 
@@ -121,7 +164,7 @@ class GameState:
         if agentIndex == 0:
             state.data.scoreChange += -TIME_PENALTY  # Penalty for waiting around
         else:
-            GhostRules.decrementTimer(state.data.agentStates[agentIndex])
+            GhostRules.decrementTimer(state.data.mutableAgentState(agentIndex))
 
         # Resolve multi-agent effects
         GhostRules.checkDeath(state, agentIndex)
@@ -129,8 +172,12 @@ class GameState:
         # Book keeping
         state.data._agentMoved = agentIndex
         state.data.score += state.data.scoreChange
-        GameState.explored.add(self)
-        GameState.explored.add(state)
+        state.data.updateHash(self.data)
+        if GameState.profile is not None:
+            GameState.profile.count('successors')
+        if GameState.explored is not None:
+            GameState.explored.add(self)
+            GameState.explored.add(state)
         return state
 
     def getLegalPacmanActions(self):
@@ -236,10 +283,19 @@ class GameState:
             self.data = GameStateData()
 
     def deepCopy(self):
+        if GameState.profile is not None:
+            GameState.profile.count('copies')
         state = GameState(self)
         state.data = self.data.deepCopy()
         return state
 
+    def shallowCopy(self):
+        if GameState.profile is not None:
+            GameState.profile.count('copies')
+        state = GameState()
+        state.data = self.data.shallowCopy()
+        return state
+
     def __eq__(self, other):
         """
         Allows two states to be compared.
@@ -250,6 +306,8 @@ class GameState:
         """
         Allows states to be keys of dictionaries.
         """
+        if GameState.profile is not None:
+            GameState.profile.count('hashes')
         return hash(self.data)
 
     def __str__(self):
@@ -283,11 +341,13 @@ class ClassicGameRules:
     def __init__(self, timeout=30):
         self.timeout = timeout
 
-    def newGame(self, layout, pacmanAgent, ghostAgents, display, quiet=False, catchExceptions=False):
+    def newGame(self, layout, pacmanAgent, ghostAgents, display, quiet=False, catchExceptions=False, fastLoop=False,
+                profile=False):
         agents = [pacmanAgent] + ghostAgents[:layout.getNumGhosts()]
         initState = GameState()
         initState.initialize(layout, len(ghostAgents))
-        game = Game(agents, display, self, catchExceptions=catchExceptions)
+        gameProfile = GameProfile(len(agents)) if profile else None
+        game = Game(agents, display, self, catchExceptions=catchExceptions, fastLoop=fastLoop, profile=gameProfile)
         game.state = initState
         self.initialState = initState.deepCopy()
         self.quiet = quiet
@@ -361,7 +421,7 @@ class PacmanRules:
         if action not in legal:
             raise Exception("Illegal action " + str(action))
 
-        pacmanState = state.data.agentStates[0]
+        pacmanState = state.data.mutableAgentState(0)
 
         # Update Configuration
         vector = Actions.directionToVector(action, PacmanRules.PACMAN_SPEED)
@@ -381,8 +441,7 @@ class PacmanRules:
         # Eat food
         if state.data.food[x][y]:
             state.data.scoreChange += 10
-            state.data.food = state.data.food.copy()
-            state.data.food[x][y] = False
+            state.data.food = state.data.food.withValue(x, y, False)
             state.data._foodEaten = position
             # TODO: cache numFood?
             numFood = state.getNumFood()
@@ -391,11 +450,12 @@ class PacmanRules:
                 state.data._win = True
         # Eat capsule
         if(position in state.getCapsules()):
-            state.data.capsules.remove(position)
+            state.data.capsules = [
+                capsule for capsule in state.data.capsules if capsule != position]
             state.data._capsuleEaten = position
             # Reset all ghosts' scared timers
             for index in range(1, len(state.data.agentStates)):
-                state.data.agentStates[index].scaredTimer = SCARED_TIME
+                state.data.mutableAgentState(index).scaredTimer = SCARED_TIME
     consume = staticmethod(consume)
 
 
@@ -427,7 +487,7 @@ class GhostRules:
         if action not in legal:
             raise Exception("Illegal ghost action " + str(action))
 
-        ghostState = state.data.agentStates[ghostIndex]
+        ghostState = state.data.mutableAgentState(ghostIndex)
         speed = GhostRules.GHOST_SPEED
         if ghostState.scaredTimer > 0:
             speed /= 2.0
@@ -439,8 +499,9 @@ class GhostRules:
     def decrementTimer(ghostState):
         timer = ghostState.scaredTimer
         if timer == 1:
-            ghostState.configuration.pos = nearestPoint(
-                ghostState.configuration.pos)
+            # Configurations are shared between states, so replace it
+            ghostState.configuration = Configuration(nearestPoint(
+                ghostState.configuration.pos), ghostState.configuration.direction)
         ghostState.scaredTimer = max(0, timer - 1)
     decrementTimer = staticmethod(decrementTimer)
 
@@ -462,9 +523,11 @@ class GhostRules:
     def collide(state, ghostState, agentIndex):
         if ghostState.scaredTimer > 0:
             state.data.scoreChange += 200
+            ghostState = state.data.mutableAgentState(agentIndex)
             GhostRules.placeGhost(state, ghostState)
             ghostState.scaredTimer = 0
             # Added for first-person
+            state.data._eaten = state.data._eaten[:]
             state.data._eaten[agentIndex] = True
         else:
             if not state.data._win:
@@ -544,8 +607,12 @@ def readCommand(argv):
                       help='Fixes the random seed to always play the same game', default=False)
     parser.add_option('-r', '--recordActions', action='store_true', dest='record',
                       help='Writes game histories to a file (named by the time they were played)', default=False)
+    parser.add_option('--recordFile', dest='recordFile',
+                      help='Adds the game histories to this file (implies -r)', default=None)
     parser.add_option('--replay', dest='gameToReplay',
-                      help='A recorded game file (pickle) to replay', default=None)
+                      help='A recorded game file to replay', default=None)
+    parser.add_option('--replayIndex', dest='replayIndex', type='int',
+                      help=default('Which game of the recorded game file to replay'), default=0)
     parser.add_option('-a', '--agentArgs', dest='agentArgs',
                       help='Comma separated values sent to agent. e.g. "opt1=val1,opt2,opt3=val3"')
     parser.add_option('-x', '--numTraining', dest='numTraining', type='int',
@@ -556,6 +623,13 @@ def readCommand(argv):
                       help='Turns on exception handling and timeouts during games', default=False)
     parser.add_option('--timeout', dest='timeout', type='int',
                       help=default('Maximum length of time an agent can spend computing in a single game'), default=30)
+    parser.add_option('--workers', dest='workers', type='int',
+                      help=default('Number of processes to play games in parallel (no graphics)'), default=1)
+    parser.add_option('--fastLoop', action='store_true', dest='fastLoop',
+                      help='Skips the per-move state copies and timeouts (trusted agents only)', default=False)
+    parser.add_option('--profile', dest='profile',
+                      help='Writes per game and total timings and counts to this file (.csv for CSV, else JSON)',
+                      default=None)
 
     options, otherjunk = parser.parse_args(argv)
     if len(otherjunk) != 0:
@@ -565,6 +639,14 @@ def readCommand(argv):
     # Fix the random seed
     if options.fixRandomSeed:
         random.seed('cs188')
+    if options.workers > 1:
+        if options.numTraining > 0:
+            raise Exception('Training games cannot be played with --workers')
+        # Every game gets its own seed derived from this one, so the games
+        # do not depend on how they are split between the workers
+        args['seed'] = 'cs188' if options.fixRandomSeed else random.getrandbits(32)
+    if options.fastLoop and options.catchExceptions:
+        raise Exception('--fastLoop cannot be combined with --catchExceptions')
 
     # Choose a layout
     args['layout'] = layout.getLayout(options.layout)
@@ -593,7 +675,7 @@ def readCommand(argv):
     args['ghosts'] = [ghostType(i+1) for i in range(options.numGhosts)]
 
     # Choose a display format
-    if options.quietGraphics:
+    if options.quietGraphics or options.workers > 1:
         import textDisplay
         args['display'] = textDisplay.NullGraphics()
     elif options.textGraphics:
@@ -605,21 +687,23 @@ def readCommand(argv):
         args['display'] = graphicsDisplay.PacmanGraphics(
             options.zoom, frameTime=options.frameTime)
     args['numGames'] = options.numGames
-    args['record'] = options.record
+    args['record'] = options.recordFile or options.record
     args['catchExceptions'] = options.catchExceptions
     args['timeout'] = options.timeout
+    args['workers'] = options.workers
+    args['fastLoop'] = options.fastLoop
+    args['profile'] = options.profile
 
     # Special case: recorded games don't use the runGames method or args structure
     if options.gameToReplay != None:
-        print('Replaying recorded game %s.' % options.gameToReplay)
-        import pickle
-        f = open(options.gameToReplay)
+        print('Replaying recorded game %d of %s.' % (options.replayIndex, options.gameToReplay))
+        import gameRecord
+        reader = gameRecord.GameRecordReader(options.gameToReplay)
         try:
-            recorded = pickle.load(f)
+            recorded = reader.getGame(options.replayIndex)
+            replayGame(recorded.getLayout(), recorded.actions(), args['display'], recorded.numAgents - 1)
         finally:
-            f.close()
-        recorded['display'] = args['display']
-        replayGame(**recorded)
+            reader.close()
         sys.exit(0)
 
     return args
@@ -653,12 +737,14 @@ def loadAgent(pacman, nographics):
                     ' is not specified in any *Agents.py.')
 
 
-def replayGame(layout, actions, display):
+def replayGame(layout, actions, display, numGhosts=None):
     import pacmanAgents
     import ghostAgents
+    if numGhosts is None:
+        numGhosts = layout.getNumGhosts()
     rules = ClassicGameRules()
     agents = [pacmanAgents.GreedyAgent()] + [ghostAgents.RandomGhost(i+1)
-                                             for i in range(layout.getNumGhosts())]
+                                             for i in range(numGhosts)]
     game = rules.newGame(layout, agents[0], agents[1:], display)
     state = game.state
     display.initialize(state.data)
@@ -674,12 +760,31 @@ def replayGame(layout, actions, display):
     display.finish()
 
 
-def runGames(layout, pacman, ghosts, display, numGames, record, numTraining=0, catchExceptions=False, timeout=30):
+def runGames(layout, pacman, ghosts, display, numGames, record, numTraining=0, catchExceptions=False, timeout=30,
+             workers=1, seed=None, fastLoop=False, profile=None):
+    """
+    Plays numGames games and prints a summary of the scores.
+
+    With workers > 1 the games are played without graphics in a pool of
+    processes (see runBatchGames), and (score, win, moves) tuples are
+    returned instead of the Game objects.  With fastLoop the games use
+    Game.runFast, which trusts the agents not to modify their observations.
+    With profile, a GameProfile of every game and their total are written
+    to the file named profile (see writeProfile).
+    """
+    if workers > 1:
+        return runBatchGames(layout, pacman, ghosts, numGames, record, catchExceptions, timeout, workers, seed,
+                             fastLoop, profile)
+
     import __main__
     __main__.__dict__['_display'] = display
 
     rules = ClassicGameRules(timeout)
     games = []
+    profiles = []
+    if record:
+        import gameRecord
+        writer = gameRecord.GameRecordWriter(recordFileName(record))
 
     for i in range(numGames):
         beQuiet = i < numTraining
@@ -692,36 +797,150 @@ def runGames(layout, pacman, ghosts, display, numGames, record, numTraining=0, c
             gameDisplay = display
             rules.quiet = False
         game = rules.newGame(layout, pacman, ghosts,
-                             gameDisplay, beQuiet, catchExceptions)
-        game.run()
+                             gameDisplay, beQuiet, catchExceptions, fastLoop, profile)
+        runProfiledGame(game)
         if not beQuiet:
             games.append(game)
+        profiles.append(game.profile)
 
         if record:
-            import time
-            import pickle
-            fname = ('recorded-game-%d' % (i + 1)) + \
-                '-'.join([str(t) for t in time.localtime()[1:6]])
-            f = file(fname, 'w')
-            components = {'layout': layout, 'actions': game.moveHistory}
-            pickle.dump(components, f)
-            f.close()
+            writer.addGame(layout, game.moveHistory, len(game.agents))
 
+    if record:
+        writer.close()
+    if profile:
+        writeProfile(profile, profiles)
     if (numGames-numTraining) > 0:
         scores = [game.state.getScore() for game in games]
         wins = [game.state.isWin() for game in games]
-        winRate = wins.count(True) / float(len(wins))
-        # TODO:
-        print('Average Score:', sum(scores) / float(len(scores)))
-        print('Scores:       ', ', '.join([str(score) for score in scores]))
-        print('Win Rate:      %d/%d (%.2f)' %
-              (wins.count(True), len(wins), winRate))
-        print('Record:       ', ', '.join(
-            [['Loss', 'Win'][int(w)] for w in wins]))
+        printSummary(scores, wins)
 
     return games
 
 
+def recordFileName(record):
+    """
+    Returns the file games are recorded to: record itself if it is a file
+    name, otherwise a name made from the time.
+    """
+    if record is True:
+        import time
+        return 'recorded-games-' + '-'.join([str(t) for t in time.localtime()[1:6]]) + '.rec'
+    return record
+
+
+def runProfiledGame(game):
+    "Runs a game, installing its profile (if any) for the game states to count into"
+    GameState.profile = game.profile
+    try:
+        game.run()
+    finally:
+        GameState.profile = None
+
+
+def writeProfile(filename, profiles):
+    """
+    Writes a list of GameProfiles and their total to filename, as CSV rows
+    (game, agent, metric, value) if it ends in .csv and as JSON otherwise.
+    """
+    import json
+    import csv
+    total = GameProfile(profiles[0].numAgents if profiles else 0)
+    for profile in profiles:
+        total.merge(profile)
+    f = open(filename, 'w')
+    try:
+        if filename.endswith('.csv'):
+            writer = csv.writer(f)
+            writer.writerow(['game', 'agent', 'metric', 'value'])
+            for i, profile in enumerate(profiles):
+                for row in profile.asRows():
+                    writer.writerow((i,) + row)
+            for row in total.asRows():
+                writer.writerow(('total',) + row)
+        else:
+            json.dump({'games': [profile.asDict() for profile in profiles], 'total': total.asDict()}, f, indent=1)
+    finally:
+        f.close()
+
+
+def printSummary(scores, wins):
+    winRate = wins.count(True) / float(len(wins))
+    # TODO:
+    print('Average Score:', sum(scores) / float(len(scores)))
+    print('Scores:       ', ', '.join([str(score) for score in scores]))
+    print('Win Rate:      %d/%d (%.2f)' %
+          (wins.count(True), len(wins), winRate))
+    print('Record:       ', ', '.join(
+        [['Loss', 'Win'][int(w)] for w in wins]))
+
+
+# The game setup shared by the games a batch worker plays; set once per
+# worker process by initBatchWorker
+_batchSetup = None
+
+
+def initBatchWorker(*setup):
+    global _batchSetup
+    _batchSetup = setup
+
+
+def playBatchGame(i):
+    """
+    Plays game number i of a batch in a worker process and returns its
+    (score, win, moves), followed by (moveHistory, numAgents) when the
+    game is recorded and None otherwise, and by the game's GameProfile
+    when profiling.
+    """
+    import textDisplay
+    layout, pacman, ghosts, record, catchExceptions, timeout, seed, fastLoop, profile = _batchSetup
+    random.seed('%s-%d' % (seed, i))
+    rules = ClassicGameRules(timeout)
+    rules.quiet = True
+    game = rules.newGame(layout, pacman, ghosts,
+                         textDisplay.NullGraphics(), True, catchExceptions, fastLoop, profile)
+    runProfiledGame(game)
+    history = (game.moveHistory, len(game.agents)) if record else None
+    return game.state.getScore(), game.state.isWin(), len(game.moveHistory), history, game.profile
+
+
+def runBatchGames(layout, pacman, ghosts, numGames, record, catchExceptions=False, timeout=30, workers=2, seed=None,
+                  fastLoop=False, profile=None):
+    """
+    Plays numGames games without graphics spread over a pool of workers
+    processes.  Game i is seeded from (seed, i), so a batch plays the same
+    games whatever the number of workers.  Prints the usual summary and
+    returns a list of (score, win, moves) tuples in game order.
+    """
+    import multiprocessing
+    if seed is None:
+        seed = random.getrandbits(32)
+    setup = (layout, pacman, ghosts, record, catchExceptions, timeout, seed, fastLoop, profile)
+    pool = multiprocessing.Pool(workers, initBatchWorker, setup)
+    try:
+        results = pool.map(playBatchGame, range(numGames), chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+    # The workers send back the games to record so a single process writes
+    # the file
+    if record:
+        import gameRecord
+        writer = gameRecord.GameRecordWriter(recordFileName(record))
+        for score, win, moves, (moveHistory, numAgents), gameProfile in results:
+            writer.addGame(layout, moveHistory, numAgents)
+        writer.close()
+    if profile:
+        writeProfile(profile, [result[4] for result in results])
+    results = [(score, win, moves) for score, win, moves, history, gameProfile in results]
+
+    if numGames > 0:
+        printSummary([score for score, win, moves in results],
+                     [win for score, win, moves in results])
+    return results
+
+
 if __name__ == '__main__':
     """
     The main function called when pacman.py is run
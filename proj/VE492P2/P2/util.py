@@ -31,6 +31,7 @@ import inspect
 import heapq
 import random
 import io
+import collections
 
 
 class FixedRandom:
@@ -175,44 +176,68 @@ class Queue:
         return len(self.list) == 0
 
 
+_REMOVED = object()  # Placeholder for entries superseded by update()
+
+
 class PriorityQueue:
     """
     Implements a priority queue data structure. Each inserted item
     has a priority associated with it and the client is usually interested
     in quick retrieval of the lowest-priority item in the queue. This
     data structure allows O(1) access to the lowest-priority item.
+
+    update() keeps a table of the best entry queued for each item.  A
+    decrease-key marks the old entry as removed and pushes a new one, so
+    it costs O(log n); removed entries are skipped when they reach the top
+    of the heap.  Items passed to update() must be hashable.
     """
 
     def __init__(self):
         self.heap = []
         self.count = 0
+        self.size = 0
+        self.entries = {}
 
     def push(self, item, priority):
-        entry = (priority, self.count, item)
+        entry = [priority, self.count, item]
         heapq.heappush(self.heap, entry)
         self.count += 1
+        self.size += 1
+        try:
+            best = self.entries.get(item)
+        except TypeError:
+            return  # Unhashable items can be pushed, but never updated
+        if best is None or priority < best[0]:
+            self.entries[item] = entry
 
     def pop(self):
-        (_, _, item) = heapq.heappop(self.heap)
+        while True:
+            entry = heapq.heappop(self.heap)
+            item = entry[2]
+            if item is not _REMOVED:
+                break
+        self.size -= 1
+        try:
+            if self.entries.get(item) is entry:
+                del self.entries[item]
+        except TypeError:
+            pass
         return item
 
     def isEmpty(self):
-        return len(self.heap) == 0
+        return self.size == 0
 
     def update(self, item, priority):
-        # If item already in priority queue with higher priority, update its priority and rebuild the heap.
+        # If item already in priority queue with higher priority, update its priority.
         # If item already in priority queue with equal or lower priority, do nothing.
         # If item not in priority queue, do the same thing as self.push.
-        for index, (p, c, i) in enumerate(self.heap):
-            if i == item:
-                if p <= priority:
-                    break
-                del self.heap[index]
-                self.heap.append((priority, c, item))
-                heapq.heapify(self.heap)
-                break
-        else:
-            self.push(item, priority)
+        entry = self.entries.get(item)
+        if entry is not None:
+            if entry[0] <= priority:
+                return
+            entry[2] = _REMOVED
+            self.size -= 1
+        self.push(item, priority)
 
 
 class PriorityQueueWithFunction(PriorityQueue):
@@ -233,6 +258,47 @@ class PriorityQueueWithFunction(PriorityQueue):
         PriorityQueue.push(self, item, self.priorityFunction(item))
 
 
+class TranspositionTable:
+    """
+    A bounded table of search results for adversarial search.  Each entry
+    is a value together with whether it is EXACT, a LOWER bound or an UPPER
+    bound on the true value (what alpha-beta knows after a cutoff).  When
+    the table is full the least recently used entry is replaced, so a table
+    kept from one move to the next holds the positions still being reached.
+    """
+    EXACT = 0
+    LOWER = 1
+    UPPER = 2
+
+    def __init__(self, size):
+        self.size = size
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        "Returns the (value, bound) stored for key, or None"
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return entry
+
+    def put(self, key, value, bound):
+        self.entries[key] = (value, bound)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
 def manhattanDistance(xy1, xy2):
     "Returns the Manhattan distance between points xy1 and xy2"
     return abs(xy1[0] - xy2[0]) + abs(xy1[1] - xy2[1])
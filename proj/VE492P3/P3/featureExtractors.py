@@ -1,6 +1,7 @@
 "Feature extractors for Pacman game states"
 
 from game import Directions, Actions
+from distanceOracle import getDistanceOracle
 import util
 
 
@@ -34,24 +35,10 @@ class CoordinateExtractor(FeatureExtractor):
 def closestFood(pos, food, walls):
     """
     closestFood -- this is similar to the function that we have
-    worked on in the search project; here its all in one place
+    worked on in the search project; here the breadth first search
+    is answered by the distance oracle shared across the layout
     """
-    fringe = [(pos[0], pos[1], 0)]
-    expanded = set()
-    while fringe:
-        pos_x, pos_y, dist = fringe.pop(0)
-        if (pos_x, pos_y) in expanded:
-            continue
-        expanded.add((pos_x, pos_y))
-        # if we find a food at this location then exit
-        if food[pos_x][pos_y]:
-            return dist
-        # otherwise spread out from the location to its neighbours
-        nbrs = Actions.getLegalNeighbors((pos_x, pos_y), walls)
-        for nbr_x, nbr_y in nbrs:
-            fringe.append((nbr_x, nbr_y, dist + 1))
-    # no food found
-    return None
+    return getDistanceOracle(walls).nearest(pos, food)
 
 
 class SimpleExtractor(FeatureExtractor):
@@ -3,6 +3,7 @@ import time
 import os
 import traceback
 import sys
+from itertools import compress
 
 
 #######################
@@ -150,10 +151,16 @@ class AgentState:
 
 class Grid:
     """
-    A 2-dimensional array of objects backed by a list of lists.  Data is accessed
+    A 2-dimensional array of booleans backed by a bytearray.  Data is accessed
     via grid[x][y] where (x,y) are positions on a Pacman map with x horizontal,
     y vertical and the origin (0,0) in the bottom left corner.
 
+    Cells are stored column by column (cell x * height + y) as bytes that are
+    0 or 1, so grid[x][y] gives 0 or 1, which compare equal to False and True.
+    grid[x] is a memoryview of column x, so grid[x][y] = True writes through.
+    Counting, copying, comparing and packing work on the whole bytearray at
+    once.
+
     The __str__ method constructs an output that is oriented like a pacman board.
     """
 
@@ -164,62 +171,73 @@ class Grid:
 
         self.width = width
         self.height = height
-        self.data = [[initialValue for y in range(
-            height)] for x in range(width)]
+        self.cells = bytearray([initialValue]) * (width * height)
+        self._makeColumns()
         if bitRepresentation:
             self._unpackBits(bitRepresentation)
 
+    def _makeColumns(self):
+        view = memoryview(self.cells)
+        height = self.height
+        self.columns = [view[x * height:(x + 1) * height] for x in range(self.width)]
+
     def __getitem__(self, i):
-        return self.data[i]
+        return self.columns[i]
 
     def __setitem__(self, key, item):
-        self.data[key] = item
+        start = key * self.height
+        self.cells[start:start + self.height] = bytes([bool(value) for value in item])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['columns']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._makeColumns()
 
     def __str__(self):
-        out = [[str(self.data[x][y])[0] for x in range(self.width)]
+        out = [[('F', 'T')[self.cells[x * self.height + y]] for x in range(self.width)]
                for y in range(self.height)]
         out.reverse()
         return '\n'.join([''.join(x) for x in out])
 
     def __eq__(self, other):
-        if other == None:
+        if other is None or not isinstance(other, Grid):
             return False
-        return self.data == other.data
+        return self.width == other.width and self.height == other.height and self.cells == other.cells
 
     def __hash__(self):
-        # return hash(str(self))
-        base = 1
-        h = 0
-        for l in self.data:
-            for i in l:
-                if i:
-                    h += base
-                base *= 2
-        return hash(h)
+        return hash((self.width, self.height, bytes(self.cells)))
 
     def copy(self):
-        g = Grid(self.width, self.height)
-        g.data = [x[:] for x in self.data]
+        g = Grid(0, 0)
+        g.width = self.width
+        g.height = self.height
+        g.cells = bytearray(self.cells)
+        g._makeColumns()
         return g
 
     def deepCopy(self):
         return self.copy()
 
     def shallowCopy(self):
-        g = Grid(self.width, self.height)
-        g.data = self.data
+        g = Grid(0, 0)
+        g.width = self.width
+        g.height = self.height
+        g.cells = self.cells
+        g.columns = self.columns
         return g
 
     def count(self, item=True):
-        return sum([x.count(item) for x in self.data])
+        return self.cells.count(int(bool(item)))
 
     def asList(self, key=True):
-        list = []
-        for x in range(self.width):
-            for y in range(self.height):
-                if self[x][y] == key:
-                    list.append((x, y))
-        return list
+        cells = self.cells
+        if not key:
+            cells = cells.translate(_NEGATED_VALUES)
+        return list(compress(cellPositions(self.width, self.height), cells))
 
     def packBits(self):
         """
@@ -228,20 +246,17 @@ class Grid:
         (width, height, bitPackedInts...)
         """
         bits = [self.width, self.height]
-        currentInt = 0
-        for i in range(self.height * self.width):
-            bit = self.CELLS_PER_INT - (i % self.CELLS_PER_INT) - 1
-            x, y = self._cellIndexToPosition(i)
-            if self[x][y]:
-                currentInt += 2 ** bit
-            if (i + 1) % self.CELLS_PER_INT == 0:
-                bits.append(currentInt)
-                currentInt = 0
-        bits.append(currentInt)
+        digits = bytes(self.cells).translate(_BINARY_DIGITS)
+        size = self.CELLS_PER_INT
+        for start in range(0, len(digits) - len(digits) % size, size):
+            bits.append(int(digits[start:start + size], 2))
+        rest = digits[len(digits) - len(digits) % size:]
+        # The last int is padded with zero bits on the right
+        bits.append(int(rest, 2) << (size - len(rest)) if rest else 0)
         return tuple(bits)
 
     def _cellIndexToPosition(self, index):
-        x = index / self.height
+        x = index // self.height
         y = index % self.height
         return x, y
 
@@ -249,27 +264,29 @@ class Grid:
         """
         Fills in data from a bit-level representation
         """
-        cell = 0
+        digits = []
         for packed in bits:
-            for bit in self._unpackInt(packed, self.CELLS_PER_INT):
-                if cell == self.width * self.height:
-                    break
-                x, y = self._cellIndexToPosition(cell)
-                self[x][y] = bit
-                cell += 1
-
-    def _unpackInt(self, packed, size):
-        bools = []
-        if packed < 0:
-            raise ValueError("must be a positive integer")
-        for i in range(size):
-            n = 2 ** (self.CELLS_PER_INT - i - 1)
-            if packed >= n:
-                bools.append(True)
-                packed -= n
-            else:
-                bools.append(False)
-        return bools
+            if packed < 0:
+                raise ValueError("must be a positive integer")
+            digits.append(format(packed, '0%db' % self.CELLS_PER_INT)[-self.CELLS_PER_INT:])
+        cells = ''.join(digits).encode()[:self.width * self.height].translate(_BINARY_VALUES)
+        self.cells[:len(cells)] = cells
+
+
+# Translation tables between cell bytes (0 or 1) and the digits '0' and '1'
+_BINARY_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+_BINARY_VALUES = bytes.maketrans(b'01', b'\x00\x01')
+_NEGATED_VALUES = bytes.maketrans(b'\x00\x01', b'\x01\x00')
+
+CELL_POSITIONS_CACHE = {}
+
+
+def cellPositions(width, height):
+    "Returns the (x, y) position of every cell index of a width x height grid"
+    key = width, height
+    if key not in CELL_POSITIONS_CACHE:
+        CELL_POSITIONS_CACHE[key] = tuple([(x, y) for x in range(width) for y in range(height)])
+    return CELL_POSITIONS_CACHE[key]
 
 
 def reconstituteGrid(bitRep):
@@ -448,7 +465,7 @@ class GameStateData:
 
     def __str__(self):
         width, height = self.layout.width, self.layout.height
-        map = Grid(width, height)
+        map = [[' '] * height for x in range(width)]
         if type(self.food) == type((1, 2)):
             self.food = reconstituteGrid(self.food)
         for x in range(width):
@@ -471,7 +488,9 @@ class GameStateData:
         for x, y in self.capsules:
             map[x][y] = 'o'
 
-        return str(map) + ("\nScore: %d\n" % self.score)
+        rows = [''.join([map[x][y] for x in range(width)]) for y in range(height)]
+        rows.reverse()
+        return '\n'.join(rows) + ("\nScore: %d\n" % self.score)
 
     def _foodWallStr(self, hasFood, hasWall):
         if hasFood:
@@ -14,9 +14,10 @@
 
 from util import manhattanDistance
 from game import Grid
+from game import Directions
+from array import array
 import os
 import random
-from functools import reduce
 
 VISIBILITY_MATRIX_CACHE = {}
 
@@ -36,31 +37,17 @@ class Layout:
         self.processLayoutText(layoutText)
         self.layoutText = layoutText
         self.totalFood = len(self.food.asList())
-        # self.initializeVisibilityMatrix()
+        self.initializeVisibilityMatrix()
 
     def getNumGhosts(self):
         return self.numGhosts
 
     def initializeVisibilityMatrix(self):
         global VISIBILITY_MATRIX_CACHE
-        if reduce(str.__add__, self.layoutText) not in VISIBILITY_MATRIX_CACHE:
-            from game import Directions
-            vecs = [(-0.5,0), (0.5,0),(0,-0.5),(0,0.5)]
-            dirs = [Directions.NORTH, Directions.SOUTH, Directions.WEST, Directions.EAST]
-            vis = Grid(self.width, self.height, {Directions.NORTH:set(), Directions.SOUTH:set(), Directions.EAST:set(), Directions.WEST:set(), Directions.STOP:set()})
-            for x in range(self.width):
-                for y in range(self.height):
-                    if self.walls[x][y] == False:
-                        for vec, direction in zip(vecs, dirs):
-                            dx, dy = vec
-                            nextx, nexty = x + dx, y + dy
-                            while (nextx + nexty) != int(nextx) + int(nexty) or not self.walls[int(nextx)][int(nexty)] :
-                                vis[x][y][direction].add((nextx, nexty))
-                                nextx, nexty = x + dx, y + dy
-            self.visibility = vis
-            VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)] = vis
-        else:
-            self.visibility = VISIBILITY_MATRIX_CACHE[reduce(str.__add__, self.layoutText)]
+        key = tuple(self.layoutText)
+        if key not in VISIBILITY_MATRIX_CACHE:
+            VISIBILITY_MATRIX_CACHE[key] = VisibilityMatrix(self.walls)
+        self.visibility = VISIBILITY_MATRIX_CACHE[key]
 
     def isWall(self, pos):
         x, col = pos
@@ -84,8 +71,8 @@ class Layout:
         return pos
 
     def isVisibleFrom(self, ghostPos, pacPos, pacDirection):
-        row, col = [int(x) for x in pacPos]
-        return ghostPos in self.visibility[row][col][pacDirection]
+        x, y = [int(c) for c in pacPos]
+        return self.visibility.isVisible(ghostPos, x, y, pacDirection)
 
     def __str__(self):
         return "\n".join(self.layoutText)
@@ -129,6 +116,63 @@ class Layout:
         elif layoutChar in  ['1', '2', '3', '4']:
             self.agentPositions.append( (int(layoutChar), (x,y)))
             self.numGhosts += 1
+
+
+class VisibilityMatrix:
+    """
+    What Pacman can see from each cell when facing each direction: the
+    positions on the ray from the cell up to (not including) the first wall.
+
+    Each direction is stored as one run per cell: an array, indexed by
+    x * height + y, of the coordinate along the ray of the first wall.
+    """
+
+    def __init__(self, walls):
+        self.height = height = walls.height
+        size = walls.width * height
+        # Cells outside the grid count as walls
+        self.north = array('h', [height]) * size
+        self.south = array('h', [-1]) * size
+        self.east = array('h', [walls.width]) * size
+        self.west = array('h', [-1]) * size
+        for x in range(walls.width):
+            column = walls[x]
+            wall = -1
+            for y in range(height):
+                self.south[x * height + y] = wall
+                if column[y]:
+                    wall = y
+            wall = height
+            for y in range(height - 1, -1, -1):
+                self.north[x * height + y] = wall
+                if column[y]:
+                    wall = y
+        for y in range(height):
+            wall = -1
+            for x in range(walls.width):
+                self.west[x * height + y] = wall
+                if walls[x][y]:
+                    wall = x
+            wall = walls.width
+            for x in range(walls.width - 1, -1, -1):
+                self.east[x * height + y] = wall
+                if walls[x][y]:
+                    wall = x
+
+    def isVisible(self, position, x, y, direction):
+        "Returns whether position can be seen from cell (x, y) facing direction"
+        px, py = position
+        cell = x * self.height + y
+        if direction == Directions.NORTH:
+            return px == x and y < py < self.north[cell]
+        if direction == Directions.SOUTH:
+            return px == x and self.south[cell] < py < y
+        if direction == Directions.EAST:
+            return py == y and x < px < self.east[cell]
+        if direction == Directions.WEST:
+            return py == y and self.west[cell] < px < x
+        return False
+
 def getLayout(name, back = 2):
     if name.endswith('.lay'):
         layout = tryToLoad('layouts/' + name)
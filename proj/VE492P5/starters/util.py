@@ -168,43 +168,66 @@ class Queue:
         "Returns true if the queue is empty"
         return len(self.list) == 0
 
+_REMOVED = object()  # Placeholder for entries superseded by update()
+
 class PriorityQueue:
     """
       Implements a priority queue data structure. Each inserted item
       has a priority associated with it and the client is usually interested
       in quick retrieval of the lowest-priority item in the queue. This
       data structure allows O(1) access to the lowest-priority item.
+
+      update() keeps a table of the best entry queued for each item.  A
+      decrease-key marks the old entry as removed and pushes a new one, so
+      it costs O(log n); removed entries are skipped when they reach the top
+      of the heap.  Items passed to update() must be hashable.
     """
     def  __init__(self):
         self.heap = []
         self.count = 0
+        self.size = 0
+        self.entries = {}
 
     def push(self, item, priority):
-        entry = (priority, self.count, item)
+        entry = [priority, self.count, item]
         heapq.heappush(self.heap, entry)
         self.count += 1
+        self.size += 1
+        try:
+            best = self.entries.get(item)
+        except TypeError:
+            return  # Unhashable items can be pushed, but never updated
+        if best is None or priority < best[0]:
+            self.entries[item] = entry
 
     def pop(self):
-        (_, _, item) = heapq.heappop(self.heap)
+        while True:
+            entry = heapq.heappop(self.heap)
+            item = entry[2]
+            if item is not _REMOVED:
+                break
+        self.size -= 1
+        try:
+            if self.entries.get(item) is entry:
+                del self.entries[item]
+        except TypeError:
+            pass
         return item
 
     def isEmpty(self):
-        return len(self.heap) == 0
+        return self.size == 0
 
     def update(self, item, priority):
-        # If item already in priority queue with higher priority, update its priority and rebuild the heap.
+        # If item already in priority queue with higher priority, update its priority.
         # If item already in priority queue with equal or lower priority, do nothing.
         # If item not in priority queue, do the same thing as self.push.
-        for index, (p, c, i) in enumerate(self.heap):
-            if i == item:
-                if p <= priority:
-                    break
-                del self.heap[index]
-                self.heap.append((priority, c, item))
-                heapq.heapify(self.heap)
-                break
-        else:
-            self.push(item, priority)
+        entry = self.entries.get(item)
+        if entry is not None:
+            if entry[0] <= priority:
+                return
+            entry[2] = _REMOVED
+            self.size -= 1
+        self.push(item, priority)
 
 class PriorityQueueWithFunction(PriorityQueue):
     """